@@ -0,0 +1,82 @@
+// Clientside callbacks registered in main.py via ClientsideFunction("antigens", ...).
+// The antigen order, labels and column lists come from the 'antigen-config'
+// Store, which main.py fills from its Python definitions, so the ordering and
+// formatting rules are only defined there.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    antigens: {
+        // Step 0: the evaluation mode toggle only copies the value
+        copyValue: function(value) {
+            return value;
+        },
+
+        // Step 2: the checkbox values are the user selection
+        selectionFromCheckboxes: function(selected_values, current_step) {
+            if (current_step !== 2) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            return selected_values || [];
+        },
+
+        // Step 2: selected antigens in panel order with their formatted labels
+        selectedDisplay: function(selected, config) {
+            var rank = config.rank, labels = config.labels;
+            var valid = (Array.isArray(selected) ? selected : []).filter(function(ag) {
+                return typeof ag === 'string' && ag.trim();
+            });
+            if (!valid.length) {
+                return 'Keine Antigene ausgewählt';
+            }
+            var position = function(ag) {
+                return rank.hasOwnProperty(ag) ? rank[ag] : Object.keys(rank).length;
+            };
+            // Array.prototype.sort is stable, so unknown antigens keep their order at the end
+            return valid.sort(function(a, b) { return position(a) - position(b); })
+                .map(function(ag) { return labels.hasOwnProperty(ag) ? labels[ag] : ag; })
+                .join(', ');
+        },
+
+        // Step 2: the selection buttons pick a list from the analysis result
+        // and tick the toggle row
+        selectionButtons: function(select_all, deselect_all, default_sel, analysis_result,
+                                   current_table_data, config) {
+            var ctx = window.dash_clientside.callback_context;
+            var no_update = window.dash_clientside.no_update;
+            if (!ctx.triggered.length) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            var skip = config.skip, antigen_columns = config.antigen_columns;
+            var result = analysis_result || {};
+            var keep = function(ag) { return skip.indexOf(ag) < 0; };
+
+            var selected;
+            var button_id = ctx.triggered[0].prop_id.split('.')[0];
+            if (button_id === 'select-all-button') {
+                selected = Object.keys(result.status_map || {}).filter(keep);
+            } else if (button_id === 'deselect-all-button') {
+                selected = [];
+            } else if (button_id === 'default-selection-button') {
+                selected = (result.selected_antigens || []).filter(keep);
+            } else {
+                throw window.dash_clientside.PreventUpdate;
+            }
+
+            try {
+                if (!Array.isArray(current_table_data) || !current_table_data.length) {
+                    return [selected, current_table_data];
+                }
+                // Update toggle row (first row)
+                var first = current_table_data[0];
+                var toggle_row = Object.assign({}, (first && typeof first === 'object') ? first : {});
+                antigen_columns.forEach(function(col) {
+                    if (toggle_row.hasOwnProperty(col)) {
+                        toggle_row[col] = selected.indexOf(col) >= 0 ? '☑' : '☐';
+                    }
+                });
+                return [selected, [toggle_row].concat(current_table_data.slice(1))];
+            } catch (e) {
+                console.error('Error in selection buttons:', e);
+                return [no_update, no_update];
+            }
+        }
+    }
+});
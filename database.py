@@ -1,11 +1,26 @@
 # database.py
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, LargeBinary
+from sqlalchemy import bindparam, create_engine, update, BigInteger, Column, Integer, String, Text, DateTime, ForeignKey, LargeBinary, Index, event, insert, select, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import deferred, sessionmaker, relationship
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.sql import func
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 import logging
+import os
+import threading
+import time
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib codec
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # msgspec is optional, LISS payloads then use the generic codec
+    msgspec = None
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -13,6 +28,68 @@ logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
+# orjson decodes/encodes the JSON payload columns several times faster than the
+# stdlib module. Its JSONDecodeError/JSONEncodeError subclass the stdlib
+# json.JSONDecodeError/TypeError, so the accessors' except clauses still apply.
+# Payloads are stored as UTF-8 JSON bytes; both loaders also accept the str
+# values of legacy rows written when the columns were TEXT.
+if orjson is not None:
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+else:
+    _json_loads = json.loads
+
+    def _json_dumps(data):
+        return json.dumps(data).encode()
+
+def _decode(value):
+    """Decode a stored JSON payload column; empty columns decode to None"""
+    return _json_loads(value) if value else None
+
+# LISS payloads are row records of scalar cells. With msgspec they are decoded
+# against that shape in C; anything that does not fit (legacy or hand-edited
+# rows) falls back to the generic loader. Column names are data-driven, so the
+# rows stay dicts rather than a fixed Struct.
+if msgspec is not None:
+    _LISS_DECODER = msgspec.json.Decoder(list[dict[str, str | int | float | bool | None]])
+    _LISS_ENCODER = msgspec.json.Encoder()
+else:
+    _LISS_DECODER = _LISS_ENCODER = None
+
+def _decode_liss(value):
+    """Decode a stored LISS payload, using the typed msgspec decoder if present"""
+    if _LISS_DECODER is not None and value:
+        try:
+            return _LISS_DECODER.decode(value)
+        except msgspec.MsgspecError:
+            pass
+    return _decode(value)
+
+def _encode_liss(data):
+    if _LISS_ENCODER is not None:
+        try:
+            return _LISS_ENCODER.encode(data)
+        except (TypeError, msgspec.EncodeError):
+            pass
+    return _json_dumps(data)
+
+_CROCKFORD32 = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+def _new_ulid(timestamp=None):
+    """Return a ULID: 48-bit millisecond timestamp plus 80 random bits, base32
+
+    timestamp (a datetime) sets the time part; it defaults to now. Naive
+    datetimes are taken as UTC, which is what func.now() stores on SQLite.
+    """
+    if timestamp is None:
+        seconds = time.time()
+    elif timestamp.tzinfo is None:
+        seconds = timestamp.replace(tzinfo=timezone.utc).timestamp()
+    else:
+        seconds = timestamp.timestamp()
+    value = (int(seconds * 1000) << 80) | int.from_bytes(os.urandom(10), "big")
+    return "".join(_CROCKFORD32[(value >> shift) & 31] for shift in range(125, -1, -5))
+
 class Donor(Base):
     __tablename__ = 'donors'
     
@@ -30,17 +107,32 @@ class Donor(Base):
 
 class Analysis(Base):
     __tablename__ = 'analyses'
+    __table_args__ = (
+        # Partial index: only legacy rows without a lot number are indexed
+        Index(
+            "ix_analyses_lot_null", "lot_number",
+            sqlite_where=text("lot_number IS NULL"),
+            postgresql_where=text("lot_number IS NULL"),
+        ),
+    )
     
-    id = Column(Integer, primary_key=True)
+    # BIGINT on servers; SQLite only aliases the rowid for a plain INTEGER key
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    # Client-generated, time-sortable identifier that needs no sequence round-trip
+    id_ulid = Column(String(26), unique=True, index=True, default=_new_ulid)
     # NOTE: Database field name kept as 'spendernummer' for consistency with existing data
     # In UI, this represents "Tz.Nr." (Tabellenzeilen-Nummer)
-    spendernummer = Column(String, ForeignKey('donors.spendernummer'))
-    timestamp = Column(DateTime, default=func.now())
+    spendernummer = Column(String, ForeignKey('donors.spendernummer'), index=True)
+    timestamp = Column(DateTime, default=func.now(), index=True)
     lot_number = Column(Text, nullable=True)  # Explicitly nullable for legacy rows
-    liss_json = Column(Text)  # Raw table after Step 1
-    status_json = Column(Text)  # status_map + exclusion info
-    user_sel_json = Column(Text)  # user selections
-    report_pdf = Column(LargeBinary)  # PDF report
+    # JSON payloads are stored as BLOBs holding UTF-8 JSON bytes so they can be
+    # written/read without a str round-trip; legacy TEXT rows still decode.
+    # The payload columns are deferred: list/summary queries never fetch them,
+    # callers that need them use .options(undefer_group("payload")).
+    liss_json = deferred(Column(LargeBinary), group="payload")  # Raw table after Step 1
+    status_json = deferred(Column(LargeBinary), group="payload")  # status_map + exclusion info
+    user_sel_json = deferred(Column(LargeBinary), group="payload")  # user selections
+    report_pdf = deferred(Column(LargeBinary), group="payload")  # PDF report
     
     # Relationship
     donor = relationship("Donor", back_populates="analyses")
@@ -48,7 +140,7 @@ class Analysis(Base):
     def get_liss_data(self):
         """Safely retrieve LISS data from JSON field"""
         try:
-            return json.loads(self.liss_json) if self.liss_json else None
+            return _decode_liss(self.liss_json)
         except (json.JSONDecodeError, TypeError) as e:
             logger.error(f"Error decoding LISS data for analysis {self.id}: {e}")
             return None
@@ -56,7 +148,7 @@ class Analysis(Base):
     def set_liss_data(self, data):
         """Safely store LISS data to JSON field"""
         try:
-            self.liss_json = json.dumps(data) if data is not None else None
+            self.liss_json = _encode_liss(data) if data is not None else None
         except (TypeError, ValueError) as e:
             logger.error(f"Error encoding LISS data for analysis {self.id}: {e}")
             self.liss_json = None
@@ -64,7 +156,7 @@ class Analysis(Base):
     def get_status_data(self):
         """Safely retrieve status data from JSON field"""
         try:
-            return json.loads(self.status_json) if self.status_json else None
+            return _decode(self.status_json)
         except (json.JSONDecodeError, TypeError) as e:
             logger.error(f"Error decoding status data for analysis {self.id}: {e}")
             return None
@@ -72,7 +164,7 @@ class Analysis(Base):
     def set_status_data(self, data):
         """Safely store status data to JSON field"""
         try:
-            self.status_json = json.dumps(data) if data is not None else None
+            self.status_json = _json_dumps(data) if data is not None else None
         except (TypeError, ValueError) as e:
             logger.error(f"Error encoding status data for analysis {self.id}: {e}")
             self.status_json = None
@@ -80,7 +172,7 @@ class Analysis(Base):
     def get_user_selections(self):
         """Safely retrieve user selections from JSON field"""
         try:
-            return json.loads(self.user_sel_json) if self.user_sel_json else None
+            return _decode(self.user_sel_json)
         except (json.JSONDecodeError, TypeError) as e:
             logger.error(f"Error decoding user selections for analysis {self.id}: {e}")
             return None
@@ -88,7 +180,7 @@ class Analysis(Base):
     def set_user_selections(self, data):
         """Safely store user selections to JSON field"""
         try:
-            self.user_sel_json = json.dumps(data) if data is not None else None
+            self.user_sel_json = _json_dumps(data) if data is not None else None
         except (TypeError, ValueError) as e:
             logger.error(f"Error encoding user selections for analysis {self.id}: {e}")
             self.user_sel_json = None
@@ -98,8 +190,60 @@ class Analysis(Base):
 
 # Database connection
 DATABASE_URL = "sqlite:///antigen_analysis.db"  # Can be changed to PostgreSQL
-engine = create_engine(DATABASE_URL, echo=False)  # Set echo=True for SQL debugging
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _engine_options(url):
+    """Pool settings sized for the dashboard instead of SQLAlchemy defaults"""
+    if url.startswith("sqlite"):
+        # Dash serves callbacks from several threads; pooled connections are
+        # only ever used by one thread at a time, so the check can be lifted
+        options = {"connect_args": {"check_same_thread": False}}
+        if url in ("sqlite://", "sqlite:///:memory:"):
+            # An in-memory database only exists on its one connection
+            options["poolclass"] = StaticPool
+        return options
+    return {
+        "pool_size": 20,
+        "max_overflow": 10,
+        "pool_pre_ping": True,  # drop connections the server closed while idle
+        "pool_recycle": 3600,
+        "pool_timeout": 30,
+    }
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Let readers and the writer proceed concurrently on SQLite"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+def make_engine(url=DATABASE_URL):
+    """Create an engine for url with the app's pool and cache settings.
+
+    The compiled-statement cache is sized above the default 500 so the app's
+    distinct ORM/Core statements are not evicted and recompiled. Creating the
+    engine opens no connection; the pool connects on first checkout.
+    """
+    new_engine = create_engine(
+        url, echo=False, query_cache_size=1200, **_engine_options(url)
+    )  # Set echo=True for SQL debugging
+    if new_engine.dialect.name == "sqlite":
+        event.listen(new_engine, "connect", _set_sqlite_pragmas)
+    return new_engine
+
+def make_session_factory(bind):
+    """Session factory used by get_db() and the startup checks"""
+    return sessionmaker(autocommit=False, autoflush=False, bind=bind)
+
+# One engine (and therefore one pool) per process; don't create more
+engine = make_engine()
+SessionLocal = make_session_factory(engine)
+
+def _dispose_pool_after_fork():
+    """Forked workers must not reuse the parent's pooled connections"""
+    engine.dispose(close=False)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_pool_after_fork)
 
 def safe_create_all():
     """Safely create database tables without losing existing data"""
@@ -113,6 +257,16 @@ def safe_create_all():
             logger.info(f"Found existing tables: {existing_tables}")
             # Tables exist, perform safe migration
             Base.metadata.create_all(bind=engine, checkfirst=True)
+            # create_all never alters existing tables; columns added since
+            # then have their own migrations
+            if "analyses" in existing_tables:
+                migrate_add_id_ulid(inspector)
+                migrate_payload_blobs()
+            # create_all skips existing tables entirely, so add any indexes
+            # declared since the database was created
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=engine, checkfirst=True)
             logger.info("Database migration completed safely")
         else:
             # Fresh database, create all tables
@@ -123,6 +277,48 @@ def safe_create_all():
         logger.error(f"Error during database initialization: {e}")
         raise
 
+def migrate_add_id_ulid(inspector, bind=None):
+    """One-off migration: add analyses.id_ulid and backfill it for existing rows.
+
+    The ULIDs of existing rows take their time part from the row's timestamp,
+    so they sort like rows created since. Safe to run again: it only adds the
+    column if it is missing and only fills rows that still have no ULID.
+    bind defaults to the app's engine.
+    """
+    analyses = Analysis.__table__
+    with (bind if bind is not None else engine).begin() as conn:
+        if "id_ulid" not in {c["name"] for c in inspector.get_columns("analyses")}:
+            conn.execute(text("ALTER TABLE analyses ADD COLUMN id_ulid VARCHAR(26)"))
+            logger.info("Added column analyses.id_ulid")
+        
+        missing = conn.execute(
+            select(analyses.c.id, analyses.c.timestamp).where(analyses.c.id_ulid.is_(None))
+        ).all()
+        if missing:
+            conn.execute(
+                update(analyses).where(analyses.c.id == bindparam("row_id")).values(id_ulid=bindparam("ulid")),
+                [{"row_id": row_id, "ulid": _new_ulid(timestamp)} for row_id, timestamp in missing],
+            )
+            logger.info(f"Backfilled id_ulid for {len(missing)} existing analyses")
+
+def migrate_payload_blobs(bind=None):
+    """One-off migration: store payloads written as TEXT as BLOBs.
+
+    SQLite keeps the storage class of each value, so rows written before the
+    payload columns became LargeBinary still hold text. Safe to run again: it
+    only touches values that are still text. bind defaults to the app's engine.
+    """
+    bind = bind if bind is not None else engine
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as conn:
+        for column in ("liss_json", "status_json", "user_sel_json"):
+            converted = conn.execute(text(
+                f"UPDATE analyses SET {column} = CAST({column} AS BLOB) WHERE typeof({column}) = 'text'"
+            )).rowcount
+            if converted:
+                logger.info(f"Converted {converted} analyses.{column} values from TEXT to BLOB")
+
 def init_database():
     """Initialize database tables safely without data loss"""
     logger.info("Initializing database...")
@@ -140,16 +336,77 @@ def get_db():
     finally:
         db.close()
 
+def get_analysis_by_ulid(db, id_ulid):
+    """Look up an analysis by its ULID instead of the database-assigned id"""
+    return db.query(Analysis).filter(Analysis.id_ulid == id_ulid).first()
+
+# Plain-object payload keys accepted by bulk_insert_analyses -> stored column
+_PAYLOAD_COLUMNS = {
+    "liss_data": "liss_json",
+    "status_data": "status_json",
+    "user_selections": "user_sel_json",
+}
+
+def bulk_insert_analyses(db, rows):
+    """Insert many analyses with one executemany INSERT instead of per-object adds.
+
+    Each row is a mapping of Analysis column values. The JSON payloads may be
+    passed as Python objects under "liss_data", "status_data" and
+    "user_selections"; they are encoded like the set_* accessors do. The
+    caller commits, as with any other session work.
+    """
+    params = []
+    for row in rows:
+        values = dict(row)
+        for key, column in _PAYLOAD_COLUMNS.items():
+            if key in values:
+                data = values.pop(key)
+                encode = _encode_liss if column == "liss_json" else _json_dumps
+                values[column] = encode(data) if data is not None else None
+        params.append(values)
+    if params:
+        db.execute(insert(Analysis), params)
+    return len(params)
+
+# Statements run at startup are built once and reused from the compiled cache
+_HEALTH_CHECK = text("SELECT 1")
+# Answered from the partial ix_analyses_lot_null index, no payload is read
+_COUNT_LEGACY_ANALYSES = select(func.count(Analysis.id)).where(Analysis.lot_number.is_(None))
+
+_SQLITE_ROW_ESTIMATES = text(
+    "SELECT tbl, MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 "
+    "WHERE tbl IN ('donors', 'analyses') GROUP BY tbl"
+)
+
+def _approximate_row_counts(db):
+    """Row counts from SQLite's ANALYZE statistics, without scanning the tables.
+
+    The first number of each sqlite_stat1 entry is the table's row count as of
+    the last ANALYZE. Returns {} on other databases or before ANALYZE has run.
+    """
+    if db.bind.dialect.name != "sqlite":
+        return {}
+    try:
+        return dict(db.execute(_SQLITE_ROW_ESTIMATES).all())
+    except OperationalError:  # no sqlite_stat1 table yet
+        db.rollback()
+        return {}
+    except Exception:
+        logger.exception("Reading the SQLite row estimates failed")
+        raise
+
 def check_database_health():
     """Check if database is accessible and healthy"""
     try:
         db = SessionLocal()
-        # Simple query to check connectivity
-        donor_count = db.query(Donor).count()
-        analysis_count = db.query(Analysis).count()
+        # Liveness only needs a round-trip, not a scan of every table
+        db.execute(_HEALTH_CHECK).scalar()
+        row_counts = _approximate_row_counts(db)
         db.close()
         
-        logger.info(f"Database health check: {donor_count} donors, {analysis_count} analyses")
+        logger.info("Database health check passed")
+        if row_counts:
+            logger.info(f"Approximate row counts (as of last ANALYZE): {row_counts}")
         return True
     except Exception as e:
         logger.error(f"Database health check failed: {e}")
@@ -160,25 +417,42 @@ def migrate_legacy_data():
     try:
         db = SessionLocal()
         
-        # Check for analyses without lot_number (legacy data)
-        legacy_analyses = db.query(Analysis).filter(Analysis.lot_number.is_(None)).all()
+        # Check for analyses without lot_number (legacy data) without loading them
+        legacy_count = db.execute(_COUNT_LEGACY_ANALYSES).scalar()
         
-        if legacy_analyses:
-            logger.info(f"Found {len(legacy_analyses)} legacy analyses without lot numbers")
+        if legacy_count:
+            logger.info(f"Found {legacy_count} legacy analyses without lot numbers")
             # We could set default lot numbers here if needed
-            # For now, just log the count
+            # For now, just log their presence
         
         db.close()
         
     except Exception as e:
         logger.error(f"Error during legacy data migration: {e}")
 
-# Initialize on import
-init_database()
+_bootstrapped = False
+_bootstrap_lock = threading.Lock()
 
-# Run health check
-if not check_database_health():
-    logger.warning("Database health check failed during initialization")
+def bootstrap():
+    """Create tables, run the health check and the legacy scan once per process.
 
-# Check for legacy data migration
-migrate_legacy_data()
\ No newline at end of file
+    Called from the web app at startup instead of on import, so scripts and
+    test workers that merely import the models don't touch the database.
+    Concurrent first callers wait until the startup work has finished.
+    """
+    global _bootstrapped
+    if _bootstrapped:
+        return
+    with _bootstrap_lock:
+        if _bootstrapped:
+            return
+        
+        init_database()
+        
+        # Run health check
+        if not check_database_health():
+            logger.warning("Database health check failed during initialization")
+        
+        # Check for legacy data migration
+        migrate_legacy_data()
+        _bootstrapped = True
\ No newline at end of file
@@ -1,20 +1,45 @@
 # main.py - FIXED VERSION
 import dash
-from dash import dcc, html, Input, Output, State, dash_table, callback_context, ALL, MATCH
+from dash import dcc, html, Input, Output, State, dash_table, callback_context, ALL, MATCH, ClientsideFunction
 import pandas as pd
 import numpy as np
 import base64
+import functools
 import io
 from datetime import datetime
+import hashlib
 import json
+import pickle
+import uuid
+from pathlib import Path
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy.orm import undefer
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, Flask then uses the stdlib codec
+    orjson = None
+
+# The background callback cache lives next to this module, like the parsed-upload
+# cache in step0_components, not in whatever directory the server starts from
+_BACKGROUND_CACHE_DIR = Path(__file__).parent / "cache"
+
+try:
+    import diskcache
+    from dash import DiskcacheManager
+    _BACKGROUND_MANAGER = DiskcacheManager(diskcache.Cache(str(_BACKGROUND_CACHE_DIR)))
+except ImportError:  # diskcache (+ multiprocess, psutil) is optional, uploads then parse in-request
+    _BACKGROUND_MANAGER = None
 
 # Import from your modules
-from database import get_db, Analysis, Donor
+from database import bootstrap, SessionLocal, Analysis, Donor
+from bounded_lru import BoundedLRU
 from step0_components import get_step0_layout, parse_pdf_content, build_diff_table, build_editable_diff_table, parse_file_content
 from navigation_and_step4 import (
     get_header_with_navigation, get_step4_layout, 
     create_exclusion_summary, create_provisional_report,
-    generate_pdf_report, create_medical_report, create_lab_technical_report
+    create_medical_report, create_lab_technical_report,
+    ANTIGEN_ORDER, sort_antigens
 )
 
 # Mapping of uppercase and lowercase letters to their superscript equivalents
@@ -29,13 +54,7 @@ superscript_map = {
     "1": "₁", "2": "₂", "3": "₃", "4": "₄", "5": "₅"  # subscript numbers
 }
 
-# Fixed antigen order for consistent sorting
-ANTIGEN_ORDER = [
-    "D", "C", "E", "c", "e", "Cw", "K", "k", "Kpa", "Kpb", "Jsa", "Jsb", 
-    "Fya", "Fyb", "Jka", "Jkb", "Lea", "Leb", "P1", "M", "N", "S", "s", 
-    "Lua", "Lub", "Xga"
-]
-
+@functools.lru_cache(maxsize=256)
 def format_antigen(ag: str) -> str:
     """Format antigen label with proper superscript/subscript formatting."""
     if len(ag) <= 1:
@@ -51,27 +70,46 @@ def format_antigen(ag: str) -> str:
     formatted_char = superscript_map.get(last_char, last_char)
     return f"{prefix}{formatted_char}"
 
-def sort_antigens(antigen_list):
-    """Sort antigens according to the predefined order."""
-    if not antigen_list:
-        return []
-    
-    # Create a mapping from antigen name to its order index
-    order_map = {ag: i for i, ag in enumerate(ANTIGEN_ORDER)}
-    
-    # Sort the list based on the predefined order
-    # Antigens not in ANTIGEN_ORDER will appear at the end
-    def sort_key(antigen):
-        return order_map.get(antigen, len(ANTIGEN_ORDER))
-    
-    return sorted(antigen_list, key=sort_key)
-
 # Initialize app
-app = dash.Dash(__name__, suppress_callback_exceptions=True)
+app = dash.Dash(__name__, suppress_callback_exceptions=True,
+                background_callback_manager=_BACKGROUND_MANAGER)
 app.title = "Antigen Analyse Dashboard"
 
+class OrjsonJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson
+
+    Dash reads every callback request body (all State/Input values, e.g. the
+    stored frames) through the Flask JSON provider; responses already go
+    through plotly's encoder, which picks orjson up on its own.
+    """
+    _OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:  # e.g. indent/sort_keys for debug responses
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, option=self._OPTIONS).decode()
+        except TypeError:  # types only the default provider knows (dates, UUIDs, ...)
+            return super().dumps(obj)
+
+if orjson is not None:
+    app.server.json = OrjsonJSONProvider(app.server)
+
+# Create tables / run startup checks once, on the first request a server
+# process handles (and before app.run below), not when the module is imported
+app.server.before_request(bootstrap)
+
 # Load default data and update column names - CORRECTED NAMING
-data = pd.read_csv("data.csv")
+# The reaction columns only hold a few symbols ("+", "0", "nt"), so they are
+# stored as categoricals instead of one Python string object per cell
+_CSV_NON_ANTIGEN_COLUMNS = {"spendernummer", "Spender", "Tz.Nr.", "Sp.Nr.", "Spez. Antigen", "Gen.", "LISS"}
+_DATA_CSV = Path(__file__).parent / "data.csv"
+data = pd.read_csv(_DATA_CSV)
+_reaction_columns = [col for col in data.columns if col not in _CSV_NON_ANTIGEN_COLUMNS]
+data[_reaction_columns] = data[_reaction_columns].astype("category")
 # Fix naming: spendernummer -> Tz.Nr., Spender -> Sp.Nr.
 if "spendernummer" in data.columns:
     data = data.rename(columns={"spendernummer": "Tz.Nr."})
@@ -80,13 +118,52 @@ if "Spender" in data.columns:
 
 # Setup options
 LISS_VALUES = ["-", "+/-", "1+", "2+", "3+", "4+"]
-ANTIGEN_COLUMNS = [col for col in data.columns if col not in ["Tz.Nr.", "Sp.Nr.", "Spez. Antigen", "Gen.", "LISS"]]
+LISS_VALUES_SET = frozenset(LISS_VALUES)
+POSITIVE_LISS_VALUES = frozenset(["+/-", "1+", "2+", "3+", "4+"])
+ANTIGEN_COLUMNS = [col for col in data.columns if col not in {"Tz.Nr.", "Sp.Nr.", "Spez. Antigen", "Gen.", "LISS"}]
+# Display labels for the table headers and checklists, formatted once
+FORMATTED_ANTIGEN = {ag: format_antigen(ag) for ag in ANTIGEN_COLUMNS}
+# O(1) membership checks; the list above keeps the display order
+ANTIGEN_COLUMNS_SET = frozenset(ANTIGEN_COLUMNS)
+
+def included_antigens(system_excluded):
+    """Antigen columns (in display order) that are not in system_excluded"""
+    if not isinstance(system_excluded, (set, frozenset)):
+        system_excluded = set(system_excluded or ())
+    return [ag for ag in ANTIGEN_COLUMNS if ag not in system_excluded]
+
+def stored_included_antigens(system_excluded, system_selection):
+    """included_antigens(system_excluded), reusing the selection stored alongside it
+
+    The 'analysis-result' Store always holds the system selection computed from
+    its exclusions; payloads without one fall back to computing it.
+    """
+    if system_selection is not None:
+        return list(system_selection)
+    return included_antigens(system_excluded)
+
+# In manual mode nothing is evaluated, every antigen starts out undecided
+_MANUAL_STATUS_MAP = {ag: "Nicht ausgeschlossen" for ag in ANTIGEN_COLUMNS}
+
+# Antithetical antigen pairs and the antigens that may still be excluded on a
+# heterozygous ("+" for both) negative cell
+EXCLUSION_PAIRS = [("C", "c"), ("E", "e"), ("K", "k"), ("Kpa", "Kpb"),
+                   ("Jsa", "Jsb"), ("Fya", "Fyb"), ("Jka", "Jkb"),
+                   ("Lea", "Leb"), ("M", "N"), ("S", "s"), ("Lua", "Lub")]
+ALLOWED_HETERO = frozenset(["Cw", "K", "Kpa", "Lua"])
+# Column positions of the pairs present in this panel, resolved once
+_COL_INDEX = {ag: i for i, ag in enumerate(ANTIGEN_COLUMNS)}
+_PAIR_IDX = np.array([(_COL_INDEX[a1], _COL_INDEX[a2]) for a1, a2 in EXCLUSION_PAIRS
+                      if a1 in _COL_INDEX and a2 in _COL_INDEX], dtype=np.intp).reshape(-1, 2)
+_PAIR_A1_IDX, _PAIR_A2_IDX = _PAIR_IDX[:, 0], _PAIR_IDX[:, 1]
+_PAIR_A1_ALLOWED = np.array([ANTIGEN_COLUMNS[i] in ALLOWED_HETERO for i in _PAIR_A1_IDX], dtype=bool)
+_PAIR_A2_ALLOWED = np.array([ANTIGEN_COLUMNS[i] in ALLOWED_HETERO for i in _PAIR_A2_IDX], dtype=bool)
 
 # Update the navigation module with ANTIGEN_COLUMNS
 import navigation_and_step4
 navigation_and_step4.ANTIGEN_COLUMNS = ANTIGEN_COLUMNS
+navigation_and_step4.ANTIGEN_COLUMNS_SET = ANTIGEN_COLUMNS_SET
 navigation_and_step4.format_antigen = format_antigen
-navigation_and_step4.sort_antigens = sort_antigens
 
 # Color codes for analysis status
 STATUS_COLORS = {
@@ -98,133 +175,302 @@ STATUS_COLORS = {
 }
 
 # --- Utility functions ---
+@functools.lru_cache(maxsize=32)
+def _prepared_column_order(columns):
+    """Column order prepare_data produces for the given (renamed) columns"""
+    middle = [col for col in columns if col not in ("Tz.Nr.", "Spez. Antigen", "Gen.")]
+    head = ["Tz.Nr."] if "Tz.Nr." in columns else []
+    tail = ["Spez. Antigen"] if "Spez. Antigen" in columns else []
+    return tuple(head + middle + tail)
+
+def _is_prepared(df):
+    """Whether df already has the naming, column order and LISS values prepare_data produces"""
+    columns = tuple(df.columns)
+    if "spendernummer" in columns or "Spender" in columns or _prepared_column_order(columns) != columns:
+        return False
+    return "LISS" not in columns or bool(df["LISS"].isin(LISS_VALUES_SET).all())
+
 def prepare_data(df):
     """Prepare and clean the dataframe with corrected naming"""
-    df = df.copy()
-    
-    # Fix naming: spendernummer -> Tz.Nr., Spender -> Sp.Nr.
-    if "spendernummer" in df.columns:
-        df = df.rename(columns={"spendernummer": "Tz.Nr."})
-    if "Spender" in df.columns:
-        df = df.rename(columns={"Spender": "Sp.Nr."})
-    
-    # Ensure Tz.Nr. column is first
-    if "Tz.Nr." in df.columns:
-        cols = df.columns.tolist()
-        cols.remove("Tz.Nr.")
-        cols.insert(0, "Tz.Nr.")
-        df = df[cols]
+    # Cleaning an already prepared frame again is a no-op, so only the copy
+    # the callers insert columns into is needed
+    if _is_prepared(df):
+        return df.copy()
     
-    if "Spez. Antigen" in df.columns:
-        spez_antigen = df["Spez. Antigen"]
-        df = df.drop(columns=["Spez. Antigen"])
-        df["Spez. Antigen"] = spez_antigen
-    
-    if "Gen." in df.columns:
-        df = df.drop(columns=["Gen."])
+    # Fix naming: spendernummer -> Tz.Nr., Spender -> Sp.Nr.; then put Tz.Nr.
+    # first, Spez. Antigen last and drop Gen. in a single reindex (a new frame,
+    # so the caller's frame is left untouched)
+    df = df.rename(columns={"spendernummer": "Tz.Nr.", "Spender": "Sp.Nr."})
+    df = df.reindex(columns=list(_prepared_column_order(tuple(df.columns))))
     
     if "LISS" in df.columns:
-        df["LISS"] = df["LISS"].apply(lambda x: x if str(x).strip() in LISS_VALUES else "-")
+        liss = df["LISS"].astype(str).str.strip()
+        df["LISS"] = liss.where(liss.isin(LISS_VALUES_SET), "-")
     
     return df
 
+# The default panel cleaned once at import; prepare_data hands out copies of it,
+# so the shared frame is never modified
+DATA_CLEAN = prepare_data(data)
+
+# --- Store serialization ---
+# Frames travel between callbacks in dcc.Store as columnar payloads (one plain
+# list per column, column order kept alongside) instead of one dict per row.
+# Payloads written by older sessions in "split" or records form are still
+# accepted.
+#
+# Each payload also carries a "key" under which this process keeps the frame
+# itself, so callbacks get it back without rebuilding it from the JSON. The
+# payload stays complete, so a restarted or different worker still rebuilds it,
+# with the column dtypes recorded in the payload so both paths give the same frame.
+_FRAME_CACHE = BoundedLRU(64)
+
+def frame_to_store(df):
+    """Serialize a dataframe for a dcc.Store"""
+    payload = {
+        "__type": "DataFrame",
+        "columns": df.columns.tolist(),
+        "dtypes": [str(dtype) for dtype in df.dtypes],
+        "index": df.index.tolist(),
+        "data": df.to_dict("list"),
+        "key": uuid.uuid4().hex,
+    }
+    _FRAME_CACHE.set(payload["key"], df.copy())
+    return payload
+
+def frame_from_store(payload):
+    """Rebuild the dataframe from a dcc.Store payload"""
+    if isinstance(payload, dict) and "columns" in payload:
+        key = payload.get("key")
+        if key is not None:
+            cached = _FRAME_CACHE.get(key)
+            if cached is not None:
+                # Callers may modify the frame, so hand out a copy
+                return cached.copy()
+        index = payload.get("index")
+        if payload.get("__type") == "DataFrame":
+            df = pd.DataFrame(payload["data"], columns=payload["columns"])
+            if index is not None:
+                df.index = index
+            return _restore_dtypes(df, payload.get("dtypes"))
+        return pd.DataFrame(payload["data"], columns=payload["columns"], index=index)
+    return pd.DataFrame(payload)
+
+def payload_key(payload):
+    """Key frame_to_store gave a Store payload, or None for older payloads
+
+    Layouts built from the payload's frame are memoized under this key.
+    """
+    return payload.get("key") if isinstance(payload, dict) else None
+
+def _restore_dtypes(df, dtypes):
+    """Apply the column dtypes recorded by frame_to_store, where they still fit"""
+    if not dtypes or len(dtypes) != len(df.columns):
+        return df
+    for i, dtype in enumerate(dtypes):
+        if dtype == str(df.dtypes.iloc[i]):
+            continue
+        try:
+            df.isetitem(i, df.iloc[:, i].astype(dtype))
+        except (TypeError, ValueError):
+            pass
+    return df
+
+def frame_to_records(df):
+    """Rows of df as dicts, like df.to_dict("records")
+
+    Goes through one object-array tolist() instead of pandas' per-cell boxing;
+    the cells come out as the same Python values.
+    """
+    columns = df.columns.tolist()
+    return [dict(zip(columns, row)) for row in df.to_numpy(dtype=object).tolist()]
+
+def records_from_store(payload):
+    """Store payload as a list of row records, e.g. for persisting to the database"""
+    if isinstance(payload, list):
+        return payload
+    if isinstance(payload, dict) and payload.get("__type") == "DataFrame":
+        # Zip the column lists into rows directly, no frame needed
+        columns = payload["columns"]
+        data = payload["data"]
+        return [dict(zip(columns, row)) for row in zip(*(data[col] for col in columns))]
+    return frame_to_records(frame_from_store(payload))
+
+# status map, exclusion reasons, system exclusions and the system selection are
+# always produced together by analyze_data, so they share one Store
+def analysis_result_to_store(status_map, exclusion_reasons, system_excluded, selected_antigens):
+    """Bundle the analysis outputs for the 'analysis-result' Store"""
+    return {
+        "status_map": status_map,
+        "exclusion_reasons": exclusion_reasons,
+        "system_excluded": list(system_excluded),
+        "selected_antigens": list(selected_antigens),
+    }
+
+def analysis_result_from_store(payload):
+    """(status_map, exclusion_reasons, system_excluded, selected_antigens) from the Store"""
+    payload = payload or {}
+    return (payload.get("status_map"), payload.get("exclusion_reasons"),
+            payload.get("system_excluded"), payload.get("selected_antigens"))
+
+def first_store_value(payload, column):
+    """First value of a column in a dcc.Store payload, or None"""
+    if isinstance(payload, dict) and "columns" in payload:
+        data = payload["data"]
+        if isinstance(data, dict):
+            values = data.get(column)
+            return values[0] if values else None
+        if column not in payload["columns"] or not data:
+            return None
+        return data[0][payload["columns"].index(column)]
+    if isinstance(payload, list) and payload:
+        return payload[0].get(column)
+    return None
+
+# Status for a non-excluded antigen, indexed by its "+" count in positive rows (capped at 3)
+_STATUS_BY_POSITIVE_COUNT = ("Keine Reaktion", "Nicht ausgeschlossen", "Bestätigt (2x +)", "Bestätigt (3x +)")
+
+# Automatic results are memoized on the cells they depend on (LISS, antigen
+# columns, row labels). Entries are stored as immutable tuples/frozensets and
+# handed out as fresh dicts/sets, so callers can't alter the cached result.
+_ANALYSIS_CACHE = BoundedLRU(16)
+
+def _analysis_key(df):
+    """Digest of the inputs analyze_data reads, or None if they can't be pickled"""
+    try:
+        payload = pickle.dumps(
+            (df["LISS"].tolist(), df.reindex(columns=ANTIGEN_COLUMNS).to_numpy(dtype=object).tolist(),
+             df.index.tolist()),
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return None
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
 def analyze_data(df, manual_mode=False):
     """Analyze the data to determine antigen status"""
     if manual_mode:
-        status_map = {}
-        exclusion_reasons = {}
-        system_excluded = set()
-        
-        for ag in ANTIGEN_COLUMNS:
-            status_map[ag] = "Nicht ausgeschlossen"
-        
-        return status_map, exclusion_reasons, system_excluded
-    
-    # Automatic mode
-    exclusion_pairs = [("C", "c"), ("E", "e"), ("K", "k"), ("Kpa", "Kpb"),
-                      ("Jsa", "Jsb"), ("Fya", "Fyb"), ("Jka", "Jkb"),
-                      ("Lea", "Leb"), ("M", "N"), ("S", "s"), ("Lua", "Lub")]
-    allowed_hetero = ["Cw", "K", "Kpa", "Lua"]
-    
-    def zygosity(val1, val2):
-        if val1 == "+" and val2 == "+": return "hetero"
-        if val1 == "+" or val2 == "+": return "homo"
-        return "negativ"
-    
-    exclusion_tracking = {col: [] for col in ANTIGEN_COLUMNS}
-    negatives = df[df["LISS"] == "-"].drop(columns=["Sp.Nr.", "Tz.Nr.", "Spez. Antigen", "LISS"], errors='ignore')
-    
-    system_excluded = set()
-    for idx, row in negatives.iterrows():
-        temp_excl = []
-        for a in [col for col in negatives.columns if col in ANTIGEN_COLUMNS]:
-            if row.get(a) == "+":
-                temp_excl.append(a)
-                exclusion_tracking[a].append(idx + 1)
-        
-        for a1, a2 in exclusion_pairs:
-            if a1 in negatives.columns and a2 in negatives.columns:
-                status = zygosity(row.get(a1, ""), row.get(a2, ""))
-                if status == "homo":
-                    if row.get(a1) == "+": 
-                        temp_excl.append(a1)
-                        exclusion_tracking[a1].append(idx + 1)
-                    if row.get(a2) == "+": 
-                        temp_excl.append(a2)
-                        exclusion_tracking[a2].append(idx + 1)
-                elif status == "hetero":
-                    for ag in (a1, a2):
-                        if ag in allowed_hetero and row.get(ag) == "+": 
-                            temp_excl.append(ag)
-                            exclusion_tracking[ag].append(idx + 1)
-        
-        system_excluded |= set(temp_excl)
-    
-    status_map = {}
-    exclusion_reasons = {}
+        # Callers may modify the map, so hand out a copy of the constant
+        return dict(_MANUAL_STATUS_MAP), {}, set()
+    
+    key = _analysis_key(df)
+    if key is not None:
+        cached = _ANALYSIS_CACHE.get(key)
+        if cached is not None:
+            status_items, reason_items, excluded = cached
+            return dict(status_items), dict(reason_items), set(excluded)
+    
+    status_map, exclusion_reasons, system_excluded = _analyze_data(df)
+    if key is not None:
+        _ANALYSIS_CACHE.set(key, (
+            tuple(status_map.items()), tuple(exclusion_reasons.items()), frozenset(system_excluded)
+        ))
+    return status_map, exclusion_reasons, system_excluded
+
+def _analyze_data(df):
+    """Automatic analysis behind analyze_data"""
+    # "+" bitmap of the whole panel (rows x ANTIGEN_COLUMNS), built once and
+    # sliced by LISS result below; NaN and missing antigen columns are never "+".
+    # The frame itself keeps its strings for display.
+    plus = df.reindex(columns=ANTIGEN_COLUMNS).to_numpy(dtype=object) == "+"
+    negative_mask = (df["LISS"] == "-").to_numpy(dtype=bool, na_value=False)
+    positive_mask = df["LISS"].isin(POSITIVE_LISS_VALUES).to_numpy(dtype=bool, na_value=False)
+    
+    pos = plus[negative_mask]
+    # Any "+" in a negative row excludes that antigen
+    excl = pos.copy()
+    
+    if len(_PAIR_A1_IDX):
+        a1_idx, a2_idx = _PAIR_A1_IDX, _PAIR_A2_IDX
+        p1, p2 = pos[:, a1_idx], pos[:, a2_idx]
+        homo = p1 ^ p2    # exactly one antigen of the pair is "+"
+        hetero = p1 & p2  # both antigens of the pair are "+"
+        # The allowed-heterozygous rule is a per-pair column mask broadcast over the rows
+        excl[:, a1_idx] |= (homo & p1) | (hetero & _PAIR_A1_ALLOWED[None, :])
+        excl[:, a2_idx] |= (homo & p2) | (hetero & _PAIR_A2_ALLOWED[None, :])
+    
+    excluded_mask = excl.any(axis=0)
+    excluded_cols = np.flatnonzero(excluded_mask)
+    system_excluded = {ANTIGEN_COLUMNS[c] for c in excluded_cols}
+    
+    # Status of every antigen from its "+" count over the positive rows (capped
+    # at 3), overridden for the excluded ones
+    status_codes = np.minimum(plus[positive_mask].sum(axis=0), 3)
+    status_map = {
+        ag: "Ausgeschlossen" if excluded_mask[i] else _STATUS_BY_POSITIVE_COUNT[status_codes[i]]
+        for i, ag in enumerate(ANTIGEN_COLUMNS)
+    }
     
-    for ag in ANTIGEN_COLUMNS:
-        positives = df[df["LISS"].isin(["+/-", "1+", "2+", "3+", "4+"])]
-        
-        if ag in system_excluded:
-            status_map[ag] = "Ausgeschlossen"
-            exclusion_reasons[ag] = f"Tz Nr: {', '.join(map(str, sorted(set(exclusion_tracking[ag]))))}"
-        else:
-            pos_count = sum(positives[ag].fillna('').astype(str) == "+")
-            if pos_count >= 3:
-                status_map[ag] = "Bestätigt (3x +)"
-            elif pos_count == 2:
-                status_map[ag] = "Bestätigt (2x +)"
-            elif pos_count == 1:
-                status_map[ag] = "Nicht ausgeschlossen"
-            else:
-                status_map[ag] = "Keine Reaktion"
+    # Tz numbers of the excluding rows per antigen, already sorted and unique
+    row_labels = df.index.to_numpy()[negative_mask]
+    exclusion_reasons = {
+        ANTIGEN_COLUMNS[c]: f"Tz Nr: {', '.join(map(str, np.unique(row_labels[excl[:, c]] + 1).tolist()))}"
+        for c in excluded_cols
+    }
     
     return status_map, exclusion_reasons, system_excluded
 
 # --- Build table components ---
-def build_liss_table(df):
-    """Build the data table for LISS selection in Step 1 - FIXED: Row index column"""
-    df = prepare_data(df)
-    
-    # Remove Index column if it exists
-    if "Index" in df.columns:
-        df = df.drop(columns=["Index"])
-    
-    # FIXED: Add row index column immediately after LISS (showing row numbers)
-    if "LISS" in df.columns:
-        liss_idx = df.columns.get_loc("LISS")
-        
-        # CRITICAL FIX: Check if column already exists before inserting
-        if "Tz.Nr.  " not in df.columns:  # Note: double space for temporary copy
-            # Create row index column (1-based numbering for user display)
-            row_index = pd.Series(range(1, len(df) + 1), name="Tz.Nr.  ")
-            df.insert(liss_idx + 1, "Tz.Nr.  ", row_index)
-    
-    columns = []
-    for col in df.columns:
+# Table styles depend only on the panel's antigen columns and are built once.
+# The builders share these lists/dicts, so they must be treated as read-only.
+def _antigen_cell_style(col):
+    return {"if": {"column_id": col}, "minWidth": "40px", "width": "40px", "maxWidth": "40px", "textAlign": "center"}
+
+_ANTIGEN_CELL_STYLES = {col: _antigen_cell_style(col) for col in ANTIGEN_COLUMNS}
+
+_STYLE_CELL_LISS = [
+    {"if": {"column_id": "Tz.Nr."}, "width": "60px", "textAlign": "center"},
+    {"if": {"column_id": "Sp.Nr."}, "width": "120px", "textAlign": "left"},
+    {"if": {"column_id": "Tz.Nr.  "}, "width": "80px", "textAlign": "center"},
+    {"if": {"column_id": "LISS"}, "width": "80px", "textAlign": "center"},
+    {"if": {"column_id": "Spez. Antigen"}, "width": "150px", "textAlign": "left"},
+] + list(_ANTIGEN_CELL_STYLES.values())
+
+# FIXED: Ensure antigen headers have consistent light blue background across entire cell
+_STYLE_HEADER_LISS = [
+    {
+        "if": {"column_id": col},
+        "backgroundColor": "#e3f2fd !important",
+        "color": "#1976d2 !important",
+        "fontWeight": "bold !important"
+    } for col in ANTIGEN_COLUMNS
+]
+
+_STYLE_CELL_ANALYSIS = [
+    {"if": {"column_id": "Tz.Nr."}, "width": "60px", "textAlign": "center"},
+    {"if": {"column_id": "Sp.Nr."}, "width": "120px", "textAlign": "left"},
+    {"if": {"column_id": "Tz.Nr. (Kopie)"}, "width": "80px", "textAlign": "center"},
+    {"if": {"column_id": "LISS"}, "width": "80px", "textAlign": "center"},
+    {"if": {"column_id": "Spez. Antigen"}, "width": "150px", "textAlign": "left"},
+] + list(_ANTIGEN_CELL_STYLES.values())
+
+_ANALYSIS_HEADER_STYLES = {
+    col: {"if": {"column_id": col}, "backgroundColor": "#e3f2fd", "color": "#1976d2"}
+    for col in ANTIGEN_COLUMNS
+}
+
+_STYLE_CELL_FINAL_BASE = [
+    {"if": {"column_id": "Tz.Nr."}, "width": "60px", "textAlign": "center"},
+    {"if": {"column_id": "Sp.Nr."}, "width": "120px", "textAlign": "left"},
+    {"if": {"column_id": "LISS"}, "width": "80px", "textAlign": "center"},
+]
+
+_LISS_DROPDOWN = {
+    "LISS": {
+        "options": [{"label": val, "value": val} for val in LISS_VALUES],
+        "clearable": False
+    }
+}
+
+_ANTIGEN_CHECKLIST_OPTIONS = [{"label": FORMATTED_ANTIGEN[ag], "value": ag} for ag in ANTIGEN_COLUMNS]
+
+# Column definitions only depend on the frame's column names
+@functools.lru_cache(maxsize=32)
+def _liss_column_defs(columns):
+    column_defs = []
+    for col in columns:
         # Apply superscript formatting to antigen column names
-        display_name = format_antigen(col) if col in ANTIGEN_COLUMNS else col
+        display_name = FORMATTED_ANTIGEN.get(col, col)
         
         # FIXED: Column naming - use single space for main column, double space for copy
         if col == "Tz.Nr.":
@@ -242,58 +488,102 @@ def build_liss_table(df):
             col_def["presentation"] = "dropdown"
             col_def["type"] = "text"
         
-        columns.append(col_def)
-    
-    dropdown_dict = {
-        "LISS": {
-            "options": [{"label": val, "value": val} for val in LISS_VALUES],
-            "clearable": False
-        }
+        column_defs.append(col_def)
+    return tuple(column_defs)
+
+@functools.lru_cache(maxsize=32)
+def _analysis_column_defs(columns):
+    return tuple({"name": FORMATTED_ANTIGEN.get(col, col), "id": col, "editable": False} for col in columns)
+
+@functools.lru_cache(maxsize=None)
+def _status_cell_style(col, status):
+    return {
+        "if": {"column_id": col},
+        "backgroundColor": STATUS_COLORS.get(status, "#ffffff"),
+        "color": "#ffffff" if status == "Ausgeschlossen" else "#000000"
     }
+
+def build_liss_table(df):
+    """Build the data table for LISS selection in Step 1 - FIXED: Row index column"""
+    df = prepare_data(df)
     
-    style_cell_conditional = [
-        {"if": {"column_id": "Tz.Nr."}, "width": "60px", "textAlign": "center"},
-        {"if": {"column_id": "Sp.Nr."}, "width": "120px", "textAlign": "left"},
-        {"if": {"column_id": "Tz.Nr.  "}, "width": "80px", "textAlign": "center"},
-        {"if": {"column_id": "LISS"}, "width": "80px", "textAlign": "center"},
-        {"if": {"column_id": "Spez. Antigen"}, "width": "150px", "textAlign": "left"},
-    ]
-    
-    style_cell_conditional.extend([
-        {
-            "if": {"column_id": col},
-            "minWidth": "40px",
-            "width": "40px",
-            "maxWidth": "40px",
-            "textAlign": "center",
-        } for col in ANTIGEN_COLUMNS
-    ])
+    # Remove Index column if it exists
+    if "Index" in df.columns:
+        df = df.drop(columns=["Index"])
     
-    # FIXED: Ensure antigen headers have consistent light blue background across entire cell
-    style_header_conditional = []
-    for col in ANTIGEN_COLUMNS:
-        style_header_conditional.append({
-            "if": {"column_id": col},
-            "backgroundColor": "#e3f2fd !important",
-            "color": "#1976d2 !important",
-            "fontWeight": "bold !important"
-        })
+    # FIXED: Add row index column immediately after LISS (showing row numbers)
+    if "LISS" in df.columns:
+        liss_idx = df.columns.get_loc("LISS")
+        
+        # CRITICAL FIX: Check if column already exists before inserting
+        if "Tz.Nr.  " not in df.columns:  # Note: double space for temporary copy
+            # Create row index column (1-based numbering for user display)
+            row_index = pd.Series(range(1, len(df) + 1), name="Tz.Nr.  ")
+            df.insert(liss_idx + 1, "Tz.Nr.  ", row_index)
     
     return dash_table.DataTable(
         id="data-table",
-        columns=columns,
-        data=df.to_dict("records"),
+        columns=list(_liss_column_defs(tuple(df.columns))),
+        data=frame_to_records(df),
         editable=True,
-        dropdown=dropdown_dict,
+        dropdown=_LISS_DROPDOWN,
         style_table={"maxWidth": "1100px", "margin": "0", "overflowX": "auto"},
         style_cell={"textAlign": "center", "height": "35px"},
         style_header={"backgroundColor": "#f8f9fa", "fontWeight": "bold"},
-        style_header_conditional=style_header_conditional,
-        style_cell_conditional=style_cell_conditional,
+        style_header_conditional=_STYLE_HEADER_LISS,
+        style_cell_conditional=_STYLE_CELL_LISS,
         page_size=15
     )
 
-def build_analysis_table(df, status_map, exclusion_reasons, system_excluded):
+# Built tables and step layouts are memoized on their inputs, so navigating back and forth
+# between steps with unchanged data reuses the component tree. Each kind (the first
+# element of its key) has its own cache, so e.g. the three final tables of every step 3
+# layout can't push the layouts out. The sizes cover a few panels per worker: one
+# layout per step and panel, the final tables three per step 3 layout.
+_TABLE_CACHES = {
+    "analysis": BoundedLRU(8),
+    "final": BoundedLRU(24),
+    "step1": BoundedLRU(8),
+    "step2": BoundedLRU(8),
+    "step3": BoundedLRU(8),
+    "step4": BoundedLRU(8),
+}
+
+def _frame_key(df):
+    """Content digest of a dataframe, or None if its cells can't be hashed"""
+    # hash_pandas_object hashes each row in vectorized code; the row hashes are
+    # digested in order, together with the column labels and dtypes
+    try:
+        row_hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    except TypeError:
+        return None
+    digest = hashlib.blake2b(row_hashes.tobytes(), digest_size=16)
+    digest.update(repr((df.columns.tolist(), [str(dtype) for dtype in df.dtypes])).encode())
+    return digest.digest()
+
+def _cached_table(key, build):
+    if key is None:
+        return build()
+    cache = _TABLE_CACHES[key[0]]
+    table = cache.get(key)
+    if table is None:
+        table = build()
+        cache.set(key, table)
+    return table
+
+def build_analysis_table(df, status_map, exclusion_reasons, system_excluded, frame_key=None):
+    """Build analysis table with integrated checkboxes (memoized on its inputs)
+
+    frame_key may pass in a _frame_key(df) the caller already computed.
+    """
+    if frame_key is None:
+        frame_key = _frame_key(df)
+    key = None if frame_key is None else (
+        "analysis", frame_key, tuple(sorted(status_map.items())), frozenset(system_excluded)
+    )
+    return _cached_table(key, lambda: _build_analysis_table(df, status_map, exclusion_reasons, system_excluded))
+
+def _build_analysis_table(df, status_map, exclusion_reasons, system_excluded):
     """Build analysis table with integrated checkboxes - SIMPLIFIED VERSION"""
     df = prepare_data(df)
     
@@ -307,49 +597,16 @@ def build_analysis_table(df, status_map, exclusion_reasons, system_excluded):
         row_index = pd.Series(range(1, len(df) + 1), name="Tz.Nr. (Kopie)")
         df.insert(liss_idx + 1, "Tz.Nr. (Kopie)", row_index)
 
-    # Build columns
-    columns = []
-    for col in df.columns:
-        display_name = format_antigen(col) if col in ANTIGEN_COLUMNS else col
-        col_def = {"name": display_name, "id": col, "editable": False}
-        columns.append(col_def)
-
     # Add styling for status colors - SIMPLIFIED
-    style_data_conditional = []
-    
-    for col in ANTIGEN_COLUMNS:
-        if col in df.columns:
-            status = status_map.get(col, "")
-            style_data_conditional.append({
-                "if": {"column_id": col},
-                "backgroundColor": STATUS_COLORS.get(status, "#ffffff"),
-                "color": "#000000" if status != "Ausgeschlossen" else "#ffffff"
-            })
+    style_data_conditional = [
+        _status_cell_style(col, status_map.get(col, ""))
+        for col in ANTIGEN_COLUMNS if col in df.columns
+    ]
     
     # Style antigen headers with light blue background
-    style_header_conditional = []
-    for col in ANTIGEN_COLUMNS:
-        if col in df.columns:
-            style_header_conditional.append({
-                "if": {"column_id": col},
-                "backgroundColor": "#e3f2fd",
-                "color": "#1976d2"
-            })
-
-    style_cell_conditional = [
-        {"if": {"column_id": "Tz.Nr."}, "width": "60px", "textAlign": "center"},
-        {"if": {"column_id": "Sp.Nr."}, "width": "120px", "textAlign": "left"},
-        {"if": {"column_id": "Tz.Nr. (Kopie)"}, "width": "80px", "textAlign": "center"},
-        {"if": {"column_id": "LISS"}, "width": "80px", "textAlign": "center"},
-        {"if": {"column_id": "Spez. Antigen"}, "width": "150px", "textAlign": "left"},
-    ] + [
-        {
-            "if": {"column_id": col},
-            "minWidth": "40px", "width": "40px", "maxWidth": "40px", "textAlign": "center"
-        } for col in ANTIGEN_COLUMNS
-    ]
+    style_header_conditional = [_ANALYSIS_HEADER_STYLES[col] for col in ANTIGEN_COLUMNS if col in df.columns]
 
-    default_selected = [ag for ag in ANTIGEN_COLUMNS if ag not in system_excluded]
+    default_selected = included_antigens(system_excluded)
 
     return html.Div([
         html.H4("Antigene auswählen:", className="section-title"),
@@ -365,7 +622,7 @@ def build_analysis_table(df, status_map, exclusion_reasons, system_excluded):
             html.H5("Ausgewählte Antigene:"),
             dcc.Checklist(
                 id="antigen-select-checkboxes",
-                options=[{"label": format_antigen(ag), "value": ag} for ag in ANTIGEN_COLUMNS],
+                options=_ANTIGEN_CHECKLIST_OPTIONS,
                 value=default_selected,
                 inline=True,
                 style={"display": "flex", "flexWrap": "wrap", "gap": "10px"}
@@ -374,77 +631,105 @@ def build_analysis_table(df, status_map, exclusion_reasons, system_excluded):
         
         dash_table.DataTable(
             id="analysis-table",
-            columns=columns,
-            data=df.to_dict("records"),
+            columns=list(_analysis_column_defs(tuple(df.columns))),
+            data=frame_to_records(df),
             editable=False,
             style_table={"maxWidth": "1100px", "margin": "0", "overflowX": "auto"},
             style_cell={"textAlign": "center", "height": "35px"},
             style_header={"backgroundColor": "#f8f9fa", "fontWeight": "bold"},
             style_header_conditional=style_header_conditional,
-            style_cell_conditional=style_cell_conditional,
+            style_cell_conditional=_STYLE_CELL_ANALYSIS,
             style_data_conditional=style_data_conditional,
             page_size=15
         )
     ])
 
-def build_final_table(df, included_columns, user_selections=None):
-    """Build final table - only show rows with positive reactions, no Index"""
+# Step 3 tables are paged on the server: only the visible page is sent to the
+# browser. The table id records the columns and selections the rows were built
+# from, so any worker can rebuild them from the 'analyzed-data' Store.
+FINAL_TABLE_PAGE_SIZE = 15
+
+def _final_table_page(display_df, page):
+    start = page * FINAL_TABLE_PAGE_SIZE
+    return frame_to_records(display_df.iloc[start:start + FINAL_TABLE_PAGE_SIZE])
+
+def build_final_table(df, included_columns, user_selections=None, frame_key=None, name="system"):
+    """Build final table (memoized on its inputs)
+
+    frame_key may pass in a _frame_key(df) the caller already computed; name
+    tells apart the tables of one layout.
+    """
+    if frame_key is None:
+        frame_key = _frame_key(df)
+    return _final_table_entry(df, included_columns, user_selections, frame_key, name)[0]
+
+def _final_table_entry(df, included_columns, user_selections, frame_key, name):
+    """Memoized (table, display_df) pair behind build_final_table"""
+    key = None if frame_key is None else (
+        "final", frame_key, tuple(included_columns), tuple(user_selections or ()), name
+    )
+    return _cached_table(key, lambda: _build_final_table(df, included_columns, user_selections, name))
+
+def _final_table_index(name, included_columns, user_selections):
+    return json.dumps({"name": name, "columns": list(included_columns),
+                       "selections": list(user_selections or ())})
+
+def _build_final_table(df, included_columns, user_selections=None, name="system"):
+    """Build final table - only show rows with positive reactions, no Index
+
+    Returns the table and the rows its pages are served from.
+    """
     # Remove Index column if it exists
     if "Index" in df.columns:
         df = df.drop(columns=["Index"])
     
-    # Filter out rows with only negative reactions
-    positive_liss_values = {"+/-", "1+", "2+", "3+", "4+"}
-    df_filtered = df[df["LISS"].isin(positive_liss_values)].copy()
-    
     display_columns = ['Tz.Nr.']
-    if "Sp.Nr." in df_filtered.columns:
+    if "Sp.Nr." in df.columns:
         display_columns.append('Sp.Nr.')
     display_columns.extend(['LISS'])
     display_columns.extend(included_columns)
-    display_df = df_filtered[display_columns].copy()
 
-    columns = [
-        {"name": format_antigen(col) if col in ANTIGEN_COLUMNS else col, "id": col, "editable": False}
-        for col in display_df.columns
-    ]
+    # Filter out rows with only negative reactions; rows and columns are taken
+    # in one step, which already gives a new frame
+    positive_mask = df["LISS"].isin(POSITIVE_LISS_VALUES).to_numpy()
+    display_df = df.loc[positive_mask, display_columns]
+
+    columns = list(_analysis_column_defs(tuple(display_df.columns)))
 
-    style_cell_conditional = [
-        {"if": {"column_id": "Tz.Nr."}, "width": "60px", "textAlign": "center"},
-        {"if": {"column_id": "Sp.Nr."}, "width": "120px", "textAlign": "left"},
-        {"if": {"column_id": "LISS"}, "width": "80px", "textAlign": "center"},
-    ] + [
-        {
-            "if": {"column_id": col},
-            "minWidth": "40px", "width": "40px", "maxWidth": "40px", "textAlign": "center"
-        } for col in included_columns
+    style_cell_conditional = _STYLE_CELL_FINAL_BASE + [
+        _ANTIGEN_CELL_STYLES.get(col) or _antigen_cell_style(col) for col in included_columns
     ]
 
     style_data_conditional = []
     if user_selections:
-        user_included = set(user_selections)
-        system_included = set(included_columns)
-        differences = user_included.symmetric_difference(system_included)
-        for col in differences:
-            if col in display_df.columns:
-                style_data_conditional.append({
-                    "if": {"column_id": col},
-                    "backgroundColor": "#FFEB3B",
-                    "border": "2px solid #FFC107"
-                })
+        differences = set(user_selections).symmetric_difference(included_columns)
+        # Walk the shown columns (in display order) against the set rather
+        # than probing the column list once per difference
+        style_data_conditional = [
+            {
+                "if": {"column_id": col},
+                "backgroundColor": "#FFEB3B",
+                "border": "2px solid #FFC107"
+            }
+            for col in display_df.columns if col in differences
+        ]
 
-    return dash_table.DataTable(
-        id="final-table",
+    table = dash_table.DataTable(
+        id={"type": "final-table", "index": _final_table_index(name, included_columns, user_selections)},
         columns=columns,
-        data=display_df.to_dict("records"),
+        data=_final_table_page(display_df, 0),
         editable=False,
         style_table={"maxWidth": "1100px", "margin": "0", "overflowX": "auto"},
         style_cell={"textAlign": "center", "height": "35px"},
         style_header={"backgroundColor": "#f8f9fa", "fontWeight": "bold"},
         style_cell_conditional=style_cell_conditional,
         style_data_conditional=style_data_conditional,
-        page_size=15
+        page_action="custom",
+        page_current=0,
+        page_size=FINAL_TABLE_PAGE_SIZE,
+        page_count=max(1, -(-len(display_df) // FINAL_TABLE_PAGE_SIZE))
     )
+    return table, display_df
 
 # --- Layout functions ---
 def get_landing_page():
@@ -493,9 +778,15 @@ def get_landing_page():
     ], id="landing-page", className="welcome-container")
 
 def get_step1_layout(df=None):
+    """Step 1 layout (memoized on the frame, like the Step 2/3 layouts)"""
     if df is None:
-        df = data
+        df = DATA_CLEAN
     
+    frame_key = _frame_key(df)
+    key = None if frame_key is None else ("step1", frame_key)
+    return _cached_table(key, lambda: _build_step1_layout(df))
+
+def _build_step1_layout(df):
     return html.Div([
         html.Div([
             html.Div([
@@ -519,32 +810,51 @@ def get_step1_layout(df=None):
         ], style={"marginTop": "20px", "display": "flex", "justifyContent": "center"}),
     ], id="step1-content")
 
-def get_step2_layout(df, status_map, exclusion_reasons, system_excluded, manual_mode=False):
+# The Step 2 legend and tooltip don't depend on the analysis and are built once
+_STEP2_LEGEND_ITEMS = [
+    html.Div([
+        html.Div(style={"backgroundColor": color, "width": "20px", "height": "20px", "border": "1px solid #ccc"}),
+        html.Span(status)
+    ], style={"display": "flex", "alignItems": "center", "gap": "8px", "marginRight": "20px"})
+    for status, color in STATUS_COLORS.items()
+]
+
+_STEP2_ANALYSIS_TOOLTIP = html.Div([
+    html.I(className="fas fa-info-circle"),
+    html.Div([
+        html.P("Die Farben zeigen den Status jedes Antigens:"),
+        html.Ul([
+            html.Li("Dunkelgrün: Bestätigt (3x +)"),
+            html.Li("Hellgrün: Bestätigt (2x +)"),
+            html.Li("Gelb: Nicht ausgeschlossen"),
+            html.Li("Grau: Keine Reaktion"),
+            html.Li("Rot: Ausgeschlossen (Antigen wird ausgeschlossen)")
+        ])
+    ], className="tooltip-content")
+], className="tooltip")
+
+def get_step2_layout(df, status_map, exclusion_reasons, system_excluded, manual_mode=False, frame_key=None):
+    """Enhanced Step 2 layout (memoized on its inputs, like the tables)
+
+    system_excluded may be any iterable (e.g. the list from the Store); it is
+    normalized to a frozenset once here for the cache keys and lookups below.
+    frame_key is the Store payload key df came from, if any.
+    """
+    system_excluded = frozenset(system_excluded or ())
+    if frame_key is None:
+        frame_key = _frame_key(df)
+    key = None if frame_key is None else (
+        "step2", frame_key, tuple(sorted((status_map or {}).items())),
+        tuple(sorted((exclusion_reasons or {}).items())),
+        system_excluded, bool(manual_mode)
+    )
+    return _cached_table(key, lambda: _build_step2_layout(
+        df, status_map, exclusion_reasons, system_excluded, manual_mode, frame_key
+    ))
+
+def _build_step2_layout(df, status_map, exclusion_reasons, system_excluded, manual_mode, frame_key):
     """Enhanced Step 2 layout - FIXED: exclusion summary at bottom"""
-    legend_items = []
-    for status, color in STATUS_COLORS.items():
-        legend_items.append(
-            html.Div([
-                html.Div(style={"backgroundColor": color, "width": "20px", "height": "20px", "border": "1px solid #ccc"}),
-                html.Span(status)
-            ], style={"display": "flex", "alignItems": "center", "gap": "8px", "marginRight": "20px"})
-        )
-    
-    analysis_tooltip = html.Div([
-        html.I(className="fas fa-info-circle"),
-        html.Div([
-            html.P("Die Farben zeigen den Status jedes Antigens:"),
-            html.Ul([
-                html.Li("Dunkelgrün: Bestätigt (3x +)"),
-                html.Li("Hellgrün: Bestätigt (2x +)"),
-                html.Li("Gelb: Nicht ausgeschlossen"),
-                html.Li("Grau: Keine Reaktion"),
-                html.Li("Rot: Ausgeschlossen (Antigen wird ausgeschlossen)")
-            ])
-        ], className="tooltip-content")
-    ], className="tooltip")
-    
-    default_selected = [ag for ag in ANTIGEN_COLUMNS if ag not in system_excluded]
+    default_selected = included_antigens(system_excluded)
     
     return html.Div([
         html.H3("Schritt 2: Analyse prüfen und Antigene auswählen", className="step-title"),
@@ -556,17 +866,17 @@ def get_step2_layout(df, status_map, exclusion_reasons, system_excluded, manual_
         
         html.Div([
             html.H4("Farbliche Legende:", className="section-title"),
-            html.Div(legend_items, className="legend-container")
+            html.Div(_STEP2_LEGEND_ITEMS, className="legend-container")
         ], className="legend-section"),
         
         html.Div([
-            html.H4(["Antigen-Analyse Übersicht und Auswahl:", analysis_tooltip], 
+            html.H4(["Antigen-Analyse Übersicht und Auswahl:", _STEP2_ANALYSIS_TOOLTIP], 
                    className="section-title with-tooltip"),
             html.P("Die erste Zeile enthält Checkboxen zur Auswahl der Antigene."),
         ]),
         
         html.Div(id="analysis-table-container", className="analysis-table-container", 
-                children=[build_analysis_table(df, status_map, exclusion_reasons, system_excluded)]),
+                children=[build_analysis_table(df, status_map, exclusion_reasons, system_excluded, frame_key)]),
         
         html.Div([
             html.H4("Ausgewählte Antigene:", className="section-title"),
@@ -586,8 +896,11 @@ def get_step2_layout(df, status_map, exclusion_reasons, system_excluded, manual_
         ], style={"marginTop": "20px", "display": "flex", "justifyContent": "center"}),
     ], id="step2-content")
 
-def get_step3_layout(df, included_columns, excluded_columns, user_selections=None, lot_number=""):
-    """Build step 3 layout with corrected formatting"""
+def get_step3_layout(df, included_columns, excluded_columns, user_selections=None, lot_number="", frame_key=None):
+    """Build step 3 layout with corrected formatting
+
+    frame_key is the Store payload key df came from, if any.
+    """
     # Better null/undefined handling
     if included_columns is None:
         included_columns = []
@@ -601,6 +914,25 @@ def get_step3_layout(df, included_columns, excluded_columns, user_selections=Non
     excluded_columns = [col for col in (excluded_columns if isinstance(excluded_columns, (list, set, tuple)) else []) if isinstance(col, str)]
     user_selections = [col for col in (user_selections if isinstance(user_selections, (list, set, tuple)) else []) if isinstance(col, str)]
     
+    if frame_key is None:
+        frame_key = _frame_key(df)
+    key = None if frame_key is None else (
+        "step3", frame_key, tuple(included_columns), tuple(excluded_columns), tuple(user_selections), lot_number
+    )
+    return _cached_table(key, lambda: _build_step3_layout(
+        df, included_columns, excluded_columns, user_selections, lot_number, frame_key
+    ))
+
+def _build_step3_layout(df, included_columns, excluded_columns, user_selections, lot_number, frame_key):
+    """Step 3 layout with its three final tables"""
+    def final_table(columns, name, selections=None):
+        return build_final_table(df, columns, selections, frame_key, name)
+
+    # Panel order for the comparison table, each antigen once
+    compared = dict.fromkeys(included_columns + user_selections)
+    comparison_columns = [col for col in ANTIGEN_COLUMNS if col in compared]
+    comparison_columns += [col for col in compared if col not in ANTIGEN_COLUMNS_SET]
+
     differences = []
     if user_selections:
         user_included = set(user_selections)
@@ -633,7 +965,7 @@ def get_step3_layout(df, included_columns, excluded_columns, user_selections=Non
                 html.Div([
                     html.H4("Tabelle mit Systemauswahl:", className="section-title"),
                     html.Div(id="final-table-container", children=[
-                        build_final_table(df, included_columns)
+                        final_table(included_columns, "system")
                     ])
                 ])
             ], className="custom-tab", selected_className="custom-tab-selected"),
@@ -642,7 +974,7 @@ def get_step3_layout(df, included_columns, excluded_columns, user_selections=Non
                 html.Div([
                     html.H4("Tabelle mit Benutzerauswahl:", className="section-title"),
                     html.Div(id="user-table-container", children=[
-                        build_final_table(df, user_selections)
+                        final_table(user_selections, "user")
                     ])
                 ])
             ], className="custom-tab", selected_className="custom-tab-selected"),
@@ -656,7 +988,7 @@ def get_step3_layout(df, included_columns, excluded_columns, user_selections=Non
                         html.P("Unterschiede: " + diff_str)
                     ], className="comparison-info"),
                     html.Div(id="comparison-table-container", children=[
-                        build_final_table(df, list(set(included_columns + user_selections)), user_selections)
+                        final_table(comparison_columns, "comparison", user_selections)
                     ])
                 ])
             ], className="custom-tab", selected_className="custom-tab-selected"),
@@ -675,6 +1007,38 @@ def get_step3_layout(df, included_columns, excluded_columns, user_selections=Non
         ], style={"marginTop": "20px", "display": "flex", "justifyContent": "center"}),
     ], id="step3-content")
 
+def get_step4_layout_for(df, status_map, exclusion_reasons, user_selections, lot_number=""):
+    """Step 4 layout with its two reports memoized on their inputs
+
+    Only the reports are cached; the layout around them (with the current
+    date and time) is built fresh each time.
+    """
+    user_selections = list(user_selections or [])
+    frame_key = _frame_key(df)
+    key = None if frame_key is None else (
+        "step4", frame_key, tuple(sorted((status_map or {}).items())),
+        tuple(sorted((exclusion_reasons or {}).items())), tuple(user_selections), lot_number
+    )
+    reports = _cached_table(key, lambda: (
+        create_medical_report(df, status_map, user_selections, lot_number),
+        create_lab_technical_report(df, status_map, exclusion_reasons, user_selections, ANTIGEN_COLUMNS),
+    ))
+    return get_step4_layout(df, status_map, exclusion_reasons, user_selections,
+                            lot_number=lot_number, antigen_columns=ANTIGEN_COLUMNS, reports=reports)
+
+# Row-number keys that must never end up in a selection
+_SELECTION_SKIP = frozenset({"Tz.Nr.", "Sp.Nr.", "spendernummer"})
+
+# Inputs of the clientside callbacks in assets/clientside.js: the display order
+# (as sort_antigens gives it) and the format_antigen labels are computed here, so
+# the browser only looks them up
+_ANTIGEN_CONFIG = {
+    "rank": {ag: i for i, ag in enumerate(sort_antigens(list(dict.fromkeys(ANTIGEN_ORDER + ANTIGEN_COLUMNS))))},
+    "labels": {ag: format_antigen(ag) for ag in dict.fromkeys(ANTIGEN_ORDER + ANTIGEN_COLUMNS)},
+    "skip": sorted(_SELECTION_SKIP),
+    "antigen_columns": ANTIGEN_COLUMNS,
+}
+
 # --- Main App Layout ---
 app.layout = html.Div([
     html.Div(id="header-container", children=[
@@ -689,16 +1053,14 @@ app.layout = html.Div([
     dcc.Store(id='current-step', data=-1),
     dcc.Store(id='step-states', data={0: True, 1: False, 2: False, 3: False, 4: False}),
     dcc.Store(id='analyzed-data'),
-    dcc.Store(id='status-map'),
-    dcc.Store(id='exclusion-reasons'),
-    dcc.Store(id='system-excluded'),
-    dcc.Store(id='selected-antigens'),
+    dcc.Store(id='analysis-result'),
     dcc.Store(id='user-selections'),
     dcc.Store(id='lot-number'),
     dcc.Store(id='evaluation-mode-store', data='auto'),
     dcc.Store(id='pdf-data'),
     dcc.Store(id='pdf-confidence', data=0), 
     dcc.Store(id='db-analysis-id'),
+    dcc.Store(id='antigen-config', data=_ANTIGEN_CONFIG),
     
     html.Div(id="dummy-div", style={"display": "none"}),
     html.Div(id="dummy-output", style={"display": "none"})
@@ -709,12 +1071,10 @@ app.layout = html.Div([
     [Output('antigen-select-checkboxes', 'value'),
      Output('analysis-table', 'data')],
     [Input('analysis-table', 'data')],
-    [State('system-excluded', 'data'),
-     State('status-map', 'data'),
-     State('analyzed-data', 'data')],
+    [State('analyzed-data', 'data')],
     prevent_initial_call=True
 )
-def handle_table_checkbox_clicks(table_data, system_excluded, status_map, analyzed_data):
+def handle_table_checkbox_clicks(table_data, analyzed_data):
     if not table_data or len(table_data) == 0:
         raise dash.exceptions.PreventUpdate
     
@@ -723,28 +1083,28 @@ def handle_table_checkbox_clicks(table_data, system_excluded, status_map, analyz
         toggle_row = table_data[0] if isinstance(table_data, list) else {}
         
         # Extract selected antigens from toggle row
-        selected_antigens = []
-        for col in ANTIGEN_COLUMNS:
-            if col in toggle_row and toggle_row[col] == "☑":
-                selected_antigens.append(col)
-        
-        # Update table data to ensure consistency
-        updated_table_data = []
+        selected_antigens = [col for col in ANTIGEN_COLUMNS if toggle_row.get(col) == "☑"]
+        selected_set = set(selected_antigens)
         
         # Rebuild toggle row based on current selections
         new_toggle_row = {}
         if isinstance(toggle_row, dict):
-            for col in toggle_row.keys():
-                if col in ANTIGEN_COLUMNS:
-                    new_toggle_row[col] = "☑" if col in selected_antigens else "☐"
-                else:
-                    new_toggle_row[col] = ""
+            new_toggle_row = {
+                col: ("☑" if col in selected_set else "☐") if col in ANTIGEN_COLUMNS_SET else ""
+                for col in toggle_row
+            }
+        
+        # The data rows are read-only, so a toggle row that is already in its
+        # normalized form means the table is unchanged; skip rebuilding it
+        if new_toggle_row == toggle_row:
+            return selected_antigens, dash.no_update
         
-        updated_table_data.append(new_toggle_row)
+        # Update table data to ensure consistency
+        updated_table_data = [new_toggle_row]
         
         # Add back the original data rows (excluding toggle row)
-        if analyzed_data and isinstance(analyzed_data, list):
-            df = pd.DataFrame(analyzed_data)
+        if analyzed_data:
+            df = frame_from_store(analyzed_data)
             if "Index" in df.columns:
                 df = df.drop(columns=["Index"])
             
@@ -754,7 +1114,7 @@ def handle_table_checkbox_clicks(table_data, system_excluded, status_map, analyz
                 row_index = pd.Series(range(1, len(df) + 1), name="Tz.Nr. (Kopie)")
                 df.insert(liss_idx + 1, "Tz.Nr. (Kopie)", row_index)
             
-            updated_table_data.extend(df.to_dict("records"))
+            updated_table_data.extend(frame_to_records(df))
         
         return selected_antigens, updated_table_data
         
@@ -774,34 +1134,27 @@ def handle_table_checkbox_clicks(table_data, system_excluded, status_map, analyz
     [State('current-step', 'data'),
      State('step-states', 'data'),
      State('analyzed-data', 'data'),
-     State('status-map', 'data'),
-     State('exclusion-reasons', 'data'),
-     State('system-excluded', 'data'),
+     State('analysis-result', 'data'),
      State('user-selections', 'data'),
      State('lot-number', 'data'),
      State('evaluation-mode-store', 'data')],
     prevent_initial_call=True
 )
 def handle_step_navigation(n_clicks_list, current_step, step_states, analyzed_data, 
-                          status_map, exclusion_reasons, system_excluded, 
-                          user_selections, lot_number, eval_mode):
+                          analysis_result, user_selections, lot_number, eval_mode):
     ctx = callback_context
     if not ctx.triggered:
         raise dash.exceptions.PreventUpdate
     
-    # Find which button was clicked
-    button_id = None
-    for i, clicks in enumerate(n_clicks_list):
-        if clicks:
-            prop_id = ctx.triggered[0]['prop_id']
-            if f'"index":{i}' in prop_id:
-                button_id = i
-                break
+    status_map, exclusion_reasons, system_excluded, system_selection = analysis_result_from_store(analysis_result)
     
-    if button_id is None:
+    # Dash already parses the id of the button that fired; a re-rendered
+    # header (n_clicks None) is not a click
+    button_id = ctx.triggered_id
+    if not isinstance(button_id, dict) or not ctx.triggered[0]['value']:
         raise dash.exceptions.PreventUpdate
     
-    step_num = button_id
+    step_num = button_id['index']
     
     # Check if step is accessible
     if not step_states.get(step_num, False):
@@ -809,25 +1162,28 @@ def handle_step_navigation(n_clicks_list, current_step, step_states, analyzed_da
     
     # Navigate to requested step
     if step_num == 0:
-        db_session = next(get_db())
-        return [get_step0_layout(db_session), get_header_with_navigation(0, step_states), 0]
+        # Short-lived session from the shared pool, returned as soon as the
+        # dropdown options are read
+        with SessionLocal() as db_session:
+            step0_layout = get_step0_layout(db_session)
+        return [step0_layout, get_header_with_navigation(0, step_states), 0]
     elif step_num == 1:
-        df = pd.DataFrame(analyzed_data) if analyzed_data else data
+        df = frame_from_store(analyzed_data) if analyzed_data else DATA_CLEAN
         return [get_step1_layout(df), get_header_with_navigation(1, step_states), 1]
     elif step_num == 2:
-        df = pd.DataFrame(analyzed_data)
-        return [get_step2_layout(df, status_map, exclusion_reasons, set(system_excluded), eval_mode == 'manual'),
+        df = frame_from_store(analyzed_data)
+        return [get_step2_layout(df, status_map, exclusion_reasons, system_excluded, eval_mode == 'manual',
+                                 payload_key(analyzed_data)),
                 get_header_with_navigation(2, step_states), 2]
     elif step_num == 3:
-        df = pd.DataFrame(analyzed_data)
-        included = [ag for ag in ANTIGEN_COLUMNS if ag not in system_excluded]
+        df = frame_from_store(analyzed_data)
+        included = stored_included_antigens(system_excluded, system_selection)
         excluded = system_excluded
-        return [get_step3_layout(df, included, excluded, user_selections, lot_number),
+        return [get_step3_layout(df, included, excluded, user_selections, lot_number, payload_key(analyzed_data)),
                 get_header_with_navigation(3, step_states), 3]
     elif step_num == 4:
-        df = pd.DataFrame(analyzed_data)
-        return [get_step4_layout(df, status_map, exclusion_reasons, user_selections, 
-                                lot_number=lot_number, antigen_columns=ANTIGEN_COLUMNS),
+        df = frame_from_store(analyzed_data)
+        return [get_step4_layout_for(df, status_map, exclusion_reasons, user_selections, lot_number),
                 get_header_with_navigation(4, step_states), 4]
     
     raise dash.exceptions.PreventUpdate
@@ -841,23 +1197,21 @@ def handle_step_navigation(n_clicks_list, current_step, step_states, analyzed_da
      Input('quick-jump-step2-med', 'n_clicks'),
      Input('quick-jump-step2-lab', 'n_clicks')],
     [State('analyzed-data', 'data'),
-     State('status-map', 'data'),
-     State('exclusion-reasons', 'data'),
-     State('system-excluded', 'data'),
+     State('analysis-result', 'data'),
      State('evaluation-mode-store', 'data'),
      State('step-states', 'data')],
     prevent_initial_call=True
 )
-def quick_jump_to_step2(n_clicks1, n_clicks2, n_clicks3, analyzed_data, status_map, exclusion_reasons, 
-                        system_excluded, eval_mode, step_states):
+def quick_jump_to_step2(n_clicks1, n_clicks2, n_clicks3, analyzed_data, analysis_result,
+                        eval_mode, step_states):
     if not any([n_clicks1, n_clicks2, n_clicks3]):
         raise dash.exceptions.PreventUpdate
     
-    df = pd.DataFrame(analyzed_data)
-    system_excluded = set(system_excluded)
+    status_map, exclusion_reasons, system_excluded, _ = analysis_result_from_store(analysis_result)
+    df = frame_from_store(analyzed_data)
     
     step2_layout = get_step2_layout(df, status_map, exclusion_reasons, 
-                                   system_excluded, eval_mode == 'manual')
+                                   system_excluded, eval_mode == 'manual', payload_key(analyzed_data))
     
     return [step2_layout, get_header_with_navigation(2, step_states), 2]
 
@@ -886,6 +1240,11 @@ def start_analysis(n_clicks):
     [Input('pdf-upload', 'contents')],
     [State('pdf-upload', 'filename'),
      State('analyzed-data', 'data')],
+    # PDF parsing is the slowest step; with a background manager it runs in a
+    # worker process and no longer blocks other callbacks. The frame cache is
+    # per process, so the main process rebuilds this payload from its data.
+    background=_BACKGROUND_MANAGER is not None,
+    running=[(Output('pdf-upload', 'disabled'), True, False)],
     prevent_initial_call=True
 )
 def handle_file_upload(contents, filename, current_data):
@@ -904,7 +1263,7 @@ def handle_file_upload(contents, filename, current_data):
             0
         ]
     
-    current_df = pd.DataFrame(current_data) if current_data else data
+    current_df = frame_from_store(current_data) if current_data else data
     
     # Use editable view if confidence < 0.95
     if confidence < 0.95:
@@ -921,7 +1280,7 @@ def handle_file_upload(contents, filename, current_data):
     return [
         comparison,
         status_msg,
-        parsed_df.to_dict('records'),
+        frame_to_store(parsed_df),
         False,
         confidence
     ]
@@ -930,9 +1289,7 @@ def handle_file_upload(contents, filename, current_data):
 @app.callback(
     [Output('main-content', 'children', allow_duplicate=True),
      Output('analyzed-data', 'data', allow_duplicate=True),
-     Output('status-map', 'data', allow_duplicate=True),
-     Output('exclusion-reasons', 'data', allow_duplicate=True),
-     Output('system-excluded', 'data', allow_duplicate=True),
+     Output('analysis-result', 'data', allow_duplicate=True),
      Output('user-selections', 'data', allow_duplicate=True),
      Output('lot-number', 'data', allow_duplicate=True),
      Output('current-step', 'data', allow_duplicate=True),
@@ -945,31 +1302,40 @@ def load_from_database(n_clicks, analysis_id):
     if not n_clicks or not analysis_id:
         raise dash.exceptions.PreventUpdate
     
-    db = next(get_db())
-    analysis = db.query(Analysis).filter_by(id=analysis_id).first()
-    
-    if not analysis:
-        raise dash.exceptions.PreventUpdate
-    
-    liss_data = analysis.get_liss_data()
-    status_data = analysis.get_status_data()
-    user_sel = analysis.get_user_selections()
+    # Primary-key lookup fetching only the three JSON payloads this needs
+    # (not the stored PDF); the session is closed before the layout is built
+    with SessionLocal() as db:
+        analysis = db.get(Analysis, analysis_id, options=[
+            undefer(Analysis.liss_json), undefer(Analysis.status_json), undefer(Analysis.user_sel_json)
+        ])
+        
+        if not analysis:
+            raise dash.exceptions.PreventUpdate
+        
+        liss_data = analysis.get_liss_data()
+        status_data = analysis.get_status_data()
+        user_sel = analysis.get_user_selections()
+        lot_number = analysis.lot_number
     
     df = pd.DataFrame(liss_data)
     
     step_states = {0: True, 1: True, 2: True, 3: False, 4: False}
     
-    included = [ag for ag in ANTIGEN_COLUMNS if ag not in status_data.get('system_excluded', [])]
     excluded = status_data.get('system_excluded', [])
+    included = included_antigens(excluded)
     
+    analyzed_data = frame_to_store(df)
     return [
-        get_step3_layout(df, included, excluded, user_sel, analysis.lot_number),
-        liss_data,
-        status_data.get('status_map', {}),
-        status_data.get('exclusion_reasons', {}),
-        status_data.get('system_excluded', []),
+        get_step3_layout(df, included, excluded, user_sel, lot_number, payload_key(analyzed_data)),
+        analyzed_data,
+        analysis_result_to_store(
+            status_data.get('status_map', {}),
+            status_data.get('exclusion_reasons', {}),
+            excluded,
+            included
+        ),
         user_sel,
-        analysis.lot_number,
+        lot_number,
         3,
         step_states
     ]
@@ -996,9 +1362,9 @@ def proceed_from_step0(confirm_clicks, manual_clicks, pdf_data, lot_num):
     button_id = ctx.triggered[0]['prop_id'].split('.')[0]
     
     if button_id == 'step0-confirm-button' and pdf_data:
-        df = pd.DataFrame(pdf_data)
+        df = frame_from_store(pdf_data)
     else:
-        df = data
+        df = DATA_CLEAN
     
     step_states = {0: True, 1: True, 2: True, 3: True, 4: False}
     
@@ -1006,19 +1372,18 @@ def proceed_from_step0(confirm_clicks, manual_clicks, pdf_data, lot_num):
         get_step1_layout(df),
         get_header_with_navigation(1, step_states),
         1,
-        df.to_dict('records'),
+        frame_to_store(df),
         lot_num,
         step_states
     ]
 
-# Step 0 - Evaluation mode toggle
-@app.callback(
+# Step 0 - Evaluation mode toggle (runs in the browser, it only copies the value)
+app.clientside_callback(
+    ClientsideFunction(namespace="antigens", function_name="copyValue"),
     Output('evaluation-mode-store', 'data'),
     [Input('evaluation-mode', 'value')],
     prevent_initial_call=True
 )
-def update_evaluation_mode(mode):
-    return mode
 
 # Step 1 -> Step 2
 @app.callback(
@@ -1026,10 +1391,7 @@ def update_evaluation_mode(mode):
      Output('header-container', 'children', allow_duplicate=True),
      Output('current-step', 'data', allow_duplicate=True),
      Output('analyzed-data', 'data', allow_duplicate=True),
-     Output('status-map', 'data', allow_duplicate=True),
-     Output('exclusion-reasons', 'data', allow_duplicate=True),
-     Output('system-excluded', 'data', allow_duplicate=True),
-     Output('selected-antigens', 'data', allow_duplicate=True),
+     Output('analysis-result', 'data', allow_duplicate=True),
      Output('user-selections', 'data', allow_duplicate=True),
      Output('step-states', 'data', allow_duplicate=True)],
     [Input('step1-next-button', 'n_clicks')],
@@ -1045,32 +1407,30 @@ def go_to_step2(n_clicks, table_data, current_step, eval_mode, step_states):
     
     df = pd.DataFrame(table_data)
     
-    # Handle corrected naming
-    if "spendernummer" not in df.columns and "Tz.Nr." not in df.columns:
-        if "spendernummer" in data.columns:
-            df.insert(0, "Tz.Nr.", data["spendernummer"].values)
-        elif "Tz.Nr." in data.columns:
-            df.insert(0, "Tz.Nr.", data["Tz.Nr."].values)
+    # The Step 1 table already carries Tz.Nr. (build_liss_table goes through
+    # prepare_data, and the default panel is renamed at load), so this fallback
+    # to the default panel's numbers only runs for tables built without it
+    if "spendernummer" not in df.columns and "Tz.Nr." not in df.columns and "Tz.Nr." in data.columns:
+        df.insert(0, "Tz.Nr.", data["Tz.Nr."].to_numpy())
     
     status_map, exclusion_reasons, system_excluded = analyze_data(df, eval_mode == 'manual')
     
-    selected_antigens = [ag for ag in ANTIGEN_COLUMNS if ag not in system_excluded]
+    selected_antigens = included_antigens(system_excluded)
     user_selections = selected_antigens.copy()
     
     step_states[2] = True
     step_states[3] = True
     
-    step2_layout = get_step2_layout(df, status_map, exclusion_reasons, system_excluded, eval_mode == 'manual')
+    analyzed_data = frame_to_store(df)
+    step2_layout = get_step2_layout(df, status_map, exclusion_reasons, system_excluded, eval_mode == 'manual',
+                                    payload_key(analyzed_data))
     
     return [
         step2_layout,
         get_header_with_navigation(2, step_states),
         2,
-        df.to_dict('records'),
-        status_map,
-        exclusion_reasons,
-        list(system_excluded),
-        selected_antigens,
+        analyzed_data,
+        analysis_result_to_store(status_map, exclusion_reasons, system_excluded, selected_antigens),
         user_selections,
         step_states
     ]
@@ -1090,103 +1450,40 @@ def go_back_to_step1(n_clicks, analyzed_data, current_step, step_states):
     if not n_clicks or current_step != 2:
         raise dash.exceptions.PreventUpdate
     
-    df = pd.DataFrame(analyzed_data)
+    df = frame_from_store(analyzed_data)
     return [get_step1_layout(df), get_header_with_navigation(1, step_states), 1]
 
-# Update selected antigens display with sorted order
-@app.callback(
+# Update selected antigens display with sorted order (runs in the browser)
+app.clientside_callback(
+    ClientsideFunction(namespace="antigens", function_name="selectedDisplay"),
     Output('selected-antigens-display', 'children'),
-    [Input('user-selections', 'data')]
+    [Input('user-selections', 'data')],
+    [State('antigen-config', 'data')]
 )
-def update_selected_antigens_display(selected_antigens):
-    # Add better error handling for undefined/null values
-    if not selected_antigens or selected_antigens is None:
-        return "Keine Antigene ausgewählt"
-    
-    try:
-        if isinstance(selected_antigens, list) and len(selected_antigens) > 0:
-            # Filter out any non-string values
-            valid_antigens = [ag for ag in selected_antigens if isinstance(ag, str) and ag.strip()]
-            if not valid_antigens:
-                return "Keine Antigene ausgewählt"
-            
-            sorted_antigens = sort_antigens(valid_antigens)
-            formatted_antigens = [format_antigen(ag) for ag in sorted_antigens]
-            return ", ".join(formatted_antigens)
-        else:
-            return "Keine Antigene ausgewählt"
-    except Exception as e:
-        print(f"Error in update_selected_antigens_display: {e}")
-        return "Keine Antigene ausgewählt"
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="antigens", function_name="selectionFromCheckboxes"),
     Output('user-selections', 'data', allow_duplicate=True),
     [Input('antigen-select-checkboxes', 'value')],
     [State('current-step', 'data')],
     prevent_initial_call=True
 )
-def update_user_selections_from_main_checklist(selected_values, current_step):
-    if current_step != 2:
-        raise dash.exceptions.PreventUpdate
-    if selected_values is None:
-        selected_values = []
-    return selected_values
 
 # FIXED: Selection buttons now control checkboxes properly
-@app.callback(
+# The buttons only pick a list from the analysis result and tick the toggle
+# row, so they run in the browser
+app.clientside_callback(
+    ClientsideFunction(namespace="antigens", function_name="selectionButtons"),
     [Output('antigen-select-checkboxes', 'value', allow_duplicate=True),
      Output('analysis-table', 'data', allow_duplicate=True)],
     [Input('select-all-button', 'n_clicks'),
      Input('deselect-all-button', 'n_clicks'),
      Input('default-selection-button', 'n_clicks')],
-    [State('status-map', 'data'),
-     State('selected-antigens', 'data'),
-     State('system-excluded', 'data'),
-     State('analysis-table', 'data')],
+    [State('analysis-result', 'data'),
+     State('analysis-table', 'data'),
+     State('antigen-config', 'data')],
     prevent_initial_call=True
 )
-def handle_selection_buttons(select_all, deselect_all, default_sel, status_map, system_selection, system_excluded, current_table_data):
-    ctx = callback_context
-    if not ctx.triggered:
-        raise dash.exceptions.PreventUpdate
-    
-    try:
-        button_id = ctx.triggered[0]['prop_id'].split('.')[0]
-        
-        # Determine selected antigens based on button clicked
-        if button_id == 'select-all-button':
-            # Select all antigens
-            all_antigens = [ag for ag in (status_map.keys() if status_map else []) if ag not in ["Tz.Nr."]]
-            selected_antigens = all_antigens
-        elif button_id == 'deselect-all-button':
-            # Deselect all antigens
-            selected_antigens = []
-        elif button_id == 'default-selection-button':
-            # Use system selection
-            selected_antigens = [ag for ag in (system_selection or []) if ag not in ["Tz.Nr."]]
-        else:
-            raise dash.exceptions.PreventUpdate
-        
-        # Update table data
-        if current_table_data and len(current_table_data) > 0:
-            updated_table_data = current_table_data.copy() if isinstance(current_table_data, list) else []
-            
-            if len(updated_table_data) > 0:
-                # Update toggle row (first row)
-                toggle_row = updated_table_data[0].copy() if isinstance(updated_table_data[0], dict) else {}
-                for col in ANTIGEN_COLUMNS:
-                    if col in toggle_row:
-                        toggle_row[col] = "☑" if col in selected_antigens else "☐"
-                
-                updated_table_data[0] = toggle_row
-                
-                return selected_antigens, updated_table_data
-        
-        return selected_antigens, current_table_data
-        
-    except Exception as e:
-        print(f"Error in handle_selection_buttons: {e}")
-        return dash.no_update, dash.no_update
 
 # Step 2 -> Step 3
 @app.callback(
@@ -1196,32 +1493,57 @@ def handle_selection_buttons(select_all, deselect_all, default_sel, status_map,
      Output('step-states', 'data', allow_duplicate=True)],
     [Input('step2-next-button', 'n_clicks')],
     [State('analyzed-data', 'data'),
-     State('selected-antigens', 'data'),
+     State('analysis-result', 'data'),
      State('user-selections', 'data'),
      State('current-step', 'data'),
      State('lot-number', 'data'),
      State('step-states', 'data')],
     prevent_initial_call=True
 )
-def go_to_step3(n_clicks, analyzed_data, selected_antigens, user_selections, current_step, lot_number, step_states):
+def go_to_step3(n_clicks, analyzed_data, analysis_result, user_selections, current_step, lot_number, step_states):
     if not n_clicks or current_step != 2:
         raise dash.exceptions.PreventUpdate
+    
+    _, _, _, selected_antigens = analysis_result_from_store(analysis_result)
 
-    if not analyzed_data or not isinstance(analyzed_data, list):
-        raise ValueError("Analyzed data must be a non-empty list of dictionaries.")
+    if not analyzed_data:
+        raise ValueError("Analyzed data must be a non-empty store payload.")
     
-    df = pd.DataFrame(analyzed_data)
+    df = frame_from_store(analyzed_data)
 
     included_columns = selected_antigens if selected_antigens else []
-    excluded_columns = [ag for ag in ANTIGEN_COLUMNS if ag not in included_columns]
+    included_set = set(included_columns)
+    excluded_columns = [ag for ag in ANTIGEN_COLUMNS if ag not in included_set]
 
     step_states[3] = True
     step_states[4] = True
 
-    step3_layout = get_step3_layout(df, included_columns, excluded_columns, user_selections, lot_number)
+    step3_layout = get_step3_layout(df, included_columns, excluded_columns, user_selections, lot_number,
+                                    payload_key(analyzed_data))
 
     return [step3_layout, get_header_with_navigation(3, step_states), 3, step_states]
 
+# Server-side paging for the Step 3 tables
+@app.callback(
+    Output({'type': 'final-table', 'index': MATCH}, 'data'),
+    [Input({'type': 'final-table', 'index': MATCH}, 'page_current')],
+    [State({'type': 'final-table', 'index': MATCH}, 'id'),
+     State('analyzed-data', 'data')],
+    prevent_initial_call=True
+)
+def page_final_table(page_current, table_id, analyzed_data):
+    if not analyzed_data:
+        raise dash.exceptions.PreventUpdate
+    # The rows come from the memoized table when this worker still has it and
+    # are rebuilt from the Store otherwise
+    spec = json.loads(table_id["index"])
+    df = frame_from_store(analyzed_data)
+    frame_key = payload_key(analyzed_data)
+    if frame_key is None:
+        frame_key = _frame_key(df)
+    _, display_df = _final_table_entry(df, spec["columns"], spec["selections"], frame_key, spec["name"])
+    return _final_table_page(display_df, page_current or 0)
+
 # Step 3 -> Step 2 (Back)
 @app.callback(
     [Output('main-content', 'children', allow_duplicate=True),
@@ -1229,24 +1551,21 @@ def go_to_step3(n_clicks, analyzed_data, selected_antigens, user_selections, cur
      Output('current-step', 'data', allow_duplicate=True)],
     [Input('step3-back-button', 'n_clicks')],
     [State('analyzed-data', 'data'),
-     State('status-map', 'data'),
-     State('exclusion-reasons', 'data'),
-     State('system-excluded', 'data'),
+     State('analysis-result', 'data'),
      State('current-step', 'data'),
      State('evaluation-mode-store', 'data'),
      State('step-states', 'data')],
     prevent_initial_call=True
 )
-def go_back_to_step2(n_clicks, analyzed_data, status_map, exclusion_reasons, 
-                     system_excluded, current_step, eval_mode, step_states):
+def go_back_to_step2(n_clicks, analyzed_data, analysis_result, current_step, eval_mode, step_states):
     if not n_clicks or current_step != 3:
         raise dash.exceptions.PreventUpdate
     
-    df = pd.DataFrame(analyzed_data)
-    system_excluded = set(system_excluded)
+    status_map, exclusion_reasons, system_excluded, _ = analysis_result_from_store(analysis_result)
+    df = frame_from_store(analyzed_data)
     
     step2_layout = get_step2_layout(df, status_map, exclusion_reasons, 
-                                   system_excluded, eval_mode == 'manual')
+                                   system_excluded, eval_mode == 'manual', payload_key(analyzed_data))
     
     return [step2_layout, get_header_with_navigation(2, step_states), 2]
 
@@ -1257,23 +1576,22 @@ def go_back_to_step2(n_clicks, analyzed_data, status_map, exclusion_reasons,
      Output('current-step', 'data', allow_duplicate=True)],
     [Input('step3-next-button', 'n_clicks')],
     [State('analyzed-data', 'data'),
-     State('status-map', 'data'),
-     State('exclusion-reasons', 'data'),
+     State('analysis-result', 'data'),
      State('user-selections', 'data'),
      State('lot-number', 'data'),
      State('current-step', 'data'),
      State('step-states', 'data')],
     prevent_initial_call=True
 )
-def go_to_step4(n_clicks, analyzed_data, status_map, exclusion_reasons, 
+def go_to_step4(n_clicks, analyzed_data, analysis_result, 
                 user_selections, lot_number, current_step, step_states):
     if not n_clicks or current_step != 3:
         raise dash.exceptions.PreventUpdate
     
-    df = pd.DataFrame(analyzed_data)
-    step4_layout = get_step4_layout(df, status_map, exclusion_reasons, 
-                                   user_selections, lot_number=lot_number, 
-                                   antigen_columns=ANTIGEN_COLUMNS)
+    status_map, exclusion_reasons, _, _ = analysis_result_from_store(analysis_result)
+    df = frame_from_store(analyzed_data)
+    step4_layout = get_step4_layout_for(df, status_map, exclusion_reasons, 
+                                        user_selections, lot_number)
     
     return [step4_layout, get_header_with_navigation(4, step_states), 4]
 
@@ -1282,18 +1600,21 @@ def go_to_step4(n_clicks, analyzed_data, status_map, exclusion_reasons,
     Output('download-report-pdf', 'data'),
     [Input('generate-report-pdf-button', 'n_clicks')],
     [State('analyzed-data', 'data'),
-     State('status-map', 'data'),
-     State('exclusion-reasons', 'data'),
+     State('analysis-result', 'data'),
      State('user-selections', 'data'),
      State('lot-number', 'data')],
     prevent_initial_call=True
 )
-def download_pdf_report(n_clicks, analyzed_data, status_map, exclusion_reasons, 
+def download_pdf_report(n_clicks, analyzed_data, analysis_result, 
                        user_selections, lot_number):
     if not n_clicks:
         raise dash.exceptions.PreventUpdate
     
-    df = pd.DataFrame(analyzed_data)
+    from navigation_and_step4 import generate_pdf_report
+
+    status_map, exclusion_reasons, _, _ = analysis_result_from_store(analysis_result)
+
+    df = frame_from_store(analyzed_data)
     pdf_bytes = generate_pdf_report(df, status_map, exclusion_reasons, 
                                    user_selections, lot_number=lot_number)
     
@@ -1306,43 +1627,32 @@ def download_pdf_report(n_clicks, analyzed_data, status_map, exclusion_reasons,
     Output('dummy-output', 'children', allow_duplicate=True),
     [Input('save-to-db-button', 'n_clicks')],
     [State('analyzed-data', 'data'),
-     State('status-map', 'data'),
-     State('exclusion-reasons', 'data'),
-     State('system-excluded', 'data'),
+     State('analysis-result', 'data'),
      State('user-selections', 'data'),
      State('lot-number', 'data')],
     prevent_initial_call=True
 )
-def save_to_database(n_clicks, analyzed_data, status_map, exclusion_reasons,
-                    system_excluded, user_selections, lot_number):
+def save_to_database(n_clicks, analyzed_data, analysis_result, user_selections, lot_number):
     if not n_clicks:
         raise dash.exceptions.PreventUpdate
     
-    db = next(get_db())
-    
-    df = pd.DataFrame(analyzed_data)
+    status_map, exclusion_reasons, system_excluded, _ = analysis_result_from_store(analysis_result)
     
-    # Handle corrected naming
-    spendernummer = None
-    if 'Sp.Nr.' in df.columns:
-        spendernummer = df['Sp.Nr.'].iloc[0]
-    elif 'spendernummer' in df.columns:
-        spendernummer = df['spendernummer'].iloc[0]
+    # Only the first donor number is needed, so read it from the payload
+    # instead of rebuilding the frame (handle corrected naming)
+    spendernummer = first_store_value(analyzed_data, 'Sp.Nr.')
+    if spendernummer is None:
+        spendernummer = first_store_value(analyzed_data, 'spendernummer')
     
     if not spendernummer:
         spendernummer = 'Unknown'
     
-    donor = db.query(Donor).filter_by(spendernummer=spendernummer).first()
-    if not donor:
-        donor = Donor(spendernummer=spendernummer)
-        db.add(donor)
-    
     analysis = Analysis(
         spendernummer=spendernummer,
         lot_number=lot_number
     )
     
-    analysis.set_liss_data(analyzed_data)
+    analysis.set_liss_data(records_from_store(analyzed_data))
     analysis.set_status_data({
         'status_map': status_map,
         'exclusion_reasons': exclusion_reasons,
@@ -1350,8 +1660,12 @@ def save_to_database(n_clicks, analyzed_data, status_map, exclusion_reasons,
     })
     analysis.set_user_selections(user_selections)
     
-    db.add(analysis)
-    db.commit()
+    # Encode first, then do the donor lookup and both inserts in one
+    # transaction; the session is closed again afterwards
+    with SessionLocal() as db, db.begin():
+        if db.get(Donor, spendernummer) is None:
+            db.add(Donor(spendernummer=spendernummer))
+        db.add(analysis)
     
     return "Saved to database"
 
@@ -1362,24 +1676,24 @@ def save_to_database(n_clicks, analyzed_data, status_map, exclusion_reasons,
      Output('current-step', 'data', allow_duplicate=True)],
     [Input('step4-back-button', 'n_clicks')],
     [State('analyzed-data', 'data'),
-     State('selected-antigens', 'data'),
-     State('system-excluded', 'data'),
+     State('analysis-result', 'data'),
      State('user-selections', 'data'),
      State('lot-number', 'data'),
      State('current-step', 'data'),
      State('step-states', 'data')],
     prevent_initial_call=True
 )
-def go_back_to_step3(n_clicks, analyzed_data, selected_antigens, system_excluded,
+def go_back_to_step3(n_clicks, analyzed_data, analysis_result,
                      user_selections, lot_number, current_step, step_states):
     if not n_clicks or current_step != 4:
         raise dash.exceptions.PreventUpdate
     
-    df = pd.DataFrame(analyzed_data)
-    included = [ag for ag in ANTIGEN_COLUMNS if ag not in system_excluded]
+    _, _, system_excluded, system_selection = analysis_result_from_store(analysis_result)
+    df = frame_from_store(analyzed_data)
+    included = stored_included_antigens(system_excluded, system_selection)
     excluded = system_excluded
     
-    step3_layout = get_step3_layout(df, included, excluded, user_selections, lot_number)
+    step3_layout = get_step3_layout(df, included, excluded, user_selections, lot_number, payload_key(analyzed_data))
     
     return [step3_layout, get_header_with_navigation(3, step_states), 3]
 
@@ -1389,10 +1703,7 @@ def go_back_to_step3(n_clicks, analyzed_data, selected_antigens, system_excluded
      Output('header-container', 'children', allow_duplicate=True),
      Output('current-step', 'data', allow_duplicate=True),
      Output('analyzed-data', 'data', allow_duplicate=True),
-     Output('status-map', 'data', allow_duplicate=True),
-     Output('exclusion-reasons', 'data', allow_duplicate=True),
-     Output('system-excluded', 'data', allow_duplicate=True),
-     Output('selected-antigens', 'data', allow_duplicate=True),
+     Output('analysis-result', 'data', allow_duplicate=True),
      Output('user-selections', 'data', allow_duplicate=True),
      Output('lot-number', 'data', allow_duplicate=True),
      Output('step-states', 'data', allow_duplicate=True)],
@@ -1410,7 +1721,7 @@ def restart_analysis_from_step4(n_clicks, current_step):
         get_landing_page(),
         get_header_with_navigation(-1, step_states),
         -1,
-        None, None, None, None, None, None, None,
+        None, None, None, None,
         step_states
     ]
 
@@ -1440,4 +1751,5 @@ app.index_string = '''
 '''
 
 if __name__ == "__main__":
+    bootstrap()
     app.run(debug=True)
\ No newline at end of file
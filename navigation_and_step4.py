@@ -1,18 +1,13 @@
 # navigation_and_step4.py - FIXED VERSION
 
 from __future__ import annotations
+import functools
 import io
 from datetime import datetime
 from typing import Iterable, Mapping, Sequence
 import dash
 import pandas as pd
 from dash import dcc, html, dash_table
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
-from reportlab.lib.units import cm
-from reportlab.platypus import (SimpleDocTemplate, Spacer, Paragraph, Table,
-                                TableStyle)
 
 ###############################################################################
 # ───────────────────────── Helper / shared utilities ──────────────────────── #
@@ -35,13 +30,38 @@ ANTIGEN_ORDER = [
     "Fya", "Fyb", "Jka", "Jkb", "Lea", "Leb", "P1", "M", "N", "S", "s", 
     "Lua", "Lub", "Xga"
 ]
+_ANTIGEN_ORDER_INDEX = {ag: i for i, ag in enumerate(ANTIGEN_ORDER)}
 
 _POSITIVE_LISS_VALUES: set[str] = {"+/-", "1+", "2+", "3+", "4+"}
 
+
+def _positive_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Rows with a positive LISS result (none if the LISS column is missing)."""
+    if "LISS" not in df.columns:
+        return df.iloc[:0]
+    return df[df["LISS"].isin(_POSITIVE_LISS_VALUES)]
+
+
+def _select_columns(df: pd.DataFrame, columns: Iterable[str], fill: str = "") -> pd.DataFrame:
+    """Columns of df in the given order; columns df lacks are filled with fill."""
+    columns = list(dict.fromkeys(columns))
+    selected = df.reindex(columns=columns)
+    for col in columns:
+        if col not in df.columns:
+            selected[col] = fill
+    return selected
+
+
+def _pdf_table_rows(df: pd.DataFrame, columns: Sequence[str]) -> list[list[str]]:
+    """PDF table body for the positive rows, one str cell per column."""
+    values = _select_columns(_positive_rows(df), columns).to_numpy(dtype=object)
+    return [[str(v) for v in row] for row in values.tolist()]
+
 ###############################################################################
 # ────────────────────────────── Navigation bar ────────────────────────────── #
 ###############################################################################
 
+@functools.lru_cache(maxsize=256)
 def format_antigen(antigen: str) -> str:  # noqa: D401 – simple function
     """Return an antigen name with proper superscript/subscript formatting."""
     if len(antigen) <= 1:
@@ -81,6 +101,22 @@ def format_antigen_for_pdf(antigen: str) -> str:
     formatted_char = superscript_map.get(last_char.lower(), last_char)
     return f"{prefix}{formatted_char}"
 
+@functools.lru_cache(maxsize=1)
+def _reportlab():
+    """The reportlab names the PDF exports use
+
+    reportlab is only needed once a PDF is actually exported, so it is imported
+    on the first call rather than with this module.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import (SimpleDocTemplate, Spacer, Paragraph, Table,
+                                    TableStyle)
+    return (colors, A4, ParagraphStyle, getSampleStyleSheet, cm,
+            SimpleDocTemplate, Spacer, Paragraph, Table, TableStyle)
+
 # 2. FIXED: Updated PDF generation with proper antigen formatting
 def generate_pdf_report_fixed(
     df: pd.DataFrame,
@@ -92,6 +128,9 @@ def generate_pdf_report_fixed(
 ) -> bytes:
     """Generate a PDF representation of the report with proper antigen formatting."""
 
+    (colors, A4, ParagraphStyle, getSampleStyleSheet, cm,
+     SimpleDocTemplate, Spacer, Paragraph, Table, TableStyle) = _reportlab()
+
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
     story = []
@@ -177,7 +216,6 @@ def generate_pdf_report_fixed(
     story.append(Paragraph("Antigen-Reaktionstabelle", styles["Heading3"]))
     
     # Build table data for PDF with proper antigen formatting
-    positive_liss_values = {"+/-", "1+", "2+", "3+", "4+"}
     table_data = []
     
     # Header row with properly formatted antigen names using format_antigen_for_pdf
@@ -186,18 +224,7 @@ def generate_pdf_report_fixed(
     table_data.append(header_row)
     
     # Data rows
-    for _, row in df.iterrows():
-        liss_val = row.get("LISS", "-")
-        if liss_val not in positive_liss_values:
-            continue
-            
-        data_row = [
-            str(row.get("Tz.Nr.", "")),
-            str(row.get("Sp.Nr.", "")),
-            str(liss_val)
-        ]
-        data_row.extend([str(row.get(ag, "")) for ag in sorted_selections])
-        table_data.append(data_row)
+    table_data.extend(_pdf_table_rows(df, ["Tz.Nr.", "Sp.Nr.", "LISS", *sorted_selections]))
     
     if len(table_data) > 1:  # If we have data beyond the header
         pdf_table = Table(table_data)
@@ -227,15 +254,19 @@ def sort_antigens(antigen_list):
     if not antigen_list:
         return []
     
-    # Create a mapping from antigen name to its order index
-    order_map = {ag: i for i, ag in enumerate(ANTIGEN_ORDER)}
-    
-    # Sort the list based on the predefined order
+    # One bucket per known antigen, filled in a single pass; keeps duplicates
+    # and input order like a stable sort would.
     # Antigens not in ANTIGEN_ORDER will appear at the end
-    def sort_key(antigen):
-        return order_map.get(antigen, len(ANTIGEN_ORDER))
+    buckets = [[] for _ in ANTIGEN_ORDER]
+    extras = []
+    for antigen in antigen_list:
+        i = _ANTIGEN_ORDER_INDEX.get(antigen)
+        if i is None:
+            extras.append(antigen)
+        else:
+            buckets[i].append(antigen)
     
-    return sorted(antigen_list, key=sort_key)
+    return [antigen for bucket in buckets for antigen in bucket] + extras
 
 def get_header_with_navigation(
     current_step: int = 0,
@@ -258,6 +289,20 @@ def get_header_with_navigation(
         # enable all steps the user has already *been through*
         step_states = {i: i <= current_step for i in range(5)}
 
+    # There are only a few hundred (step, states) combinations, so the built
+    # headers are shared; callers must not mutate the returned tree.
+    try:
+        return _cached_header(current_step, frozenset(step_states.items()))
+    except TypeError:  # unhashable state values
+        return _build_header(current_step, step_states)
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_header(current_step: int, step_state_items: frozenset) -> html.Div:
+    return _build_header(current_step, dict(step_state_items))
+
+
+def _build_header(current_step: int, step_states: Mapping[int, bool]) -> html.Div:
     steps = [
         {"label": "PDF & DB", "number": 0},
         {"label": "LISS-Werte", "number": 1},
@@ -341,16 +386,24 @@ def get_step4_layout(
     *,
     lot_number: str = "",
     antigen_columns: Sequence[str] | None = None,
+    reports: tuple[html.Div, html.Div] | None = None,
 ) -> html.Div:
-    """Return the Dash layout for *Schritt 4 – Bericht*."""
+    """Return the Dash layout for *Schritt 4 – Bericht*.
 
-    if antigen_columns is None:
-        antigen_columns = _guess_antigen_columns(df)
+    *reports* may pass in an already built (medical, lab) report pair for the
+    same inputs.
+    """
 
-    medical_report = create_medical_report(df, status_map, user_selections, lot_number)
-    lab_report = create_lab_technical_report(
-        df, status_map, exclusion_reasons, user_selections, antigen_columns
-    )
+    if reports is not None:
+        medical_report, lab_report = reports
+    else:
+        if antigen_columns is None:
+            antigen_columns = _guess_antigen_columns(df)
+
+        medical_report = create_medical_report(df, status_map, user_selections, lot_number)
+        lab_report = create_lab_technical_report(
+            df, status_map, exclusion_reasons, user_selections, antigen_columns
+        )
 
     quick_jump = html.Div(
         [
@@ -529,22 +582,15 @@ def create_medical_report(
         antibody_text_parts = ["Keine Antikörper nachgewiesen"]
 
     # Build the reaction table – include only rows that have positive LISS values
-    positive_liss_values = {"+/-", "1+", "2+", "3+", "4+"}
-    reaction_rows: list[dict[str, str]] = []
-    for _, row in df.iterrows():
-        liss_val = row.get("LISS", "-")
-        if liss_val not in positive_liss_values:
-            continue
-        # CORRECTED naming: use Tz.Nr. and Sp.Nr.
-        record = {"Sp.Nr.": row.get("Sp.Nr.", ""), "LISS": liss_val}
-        # Add Tz.Nr. if available
-        if "Tz.Nr." in row:
-            record["Tz.Nr."] = row["Tz.Nr."]
-        # FIXED: Add antigens in sorted order with formatting
-        for ag in sorted_selections:
-            if ag in row:
-                record[format_antigen(ag)] = row[ag]
-        reaction_rows.append(record)
+    # CORRECTED naming: use Tz.Nr. and Sp.Nr.; antigens in sorted order with formatting
+    reaction_columns = ["Sp.Nr.", "LISS"]
+    reaction_columns += ["Tz.Nr."] if "Tz.Nr." in df.columns else []
+    reaction_columns += [ag for ag in sorted_selections if ag in df.columns]
+    reaction_rows: list[dict[str, str]] = (
+        _select_columns(_positive_rows(df), reaction_columns)
+        .rename(columns={ag: format_antigen(ag) for ag in sorted_selections})
+        .to_dict("records")
+    )
 
     # Dash DataTable definition - FIXED: compact layout for single page fit
     columns_list = ["Tz.Nr.", "Sp.Nr.", "LISS"] if "Tz.Nr." in df.columns else ["Sp.Nr.", "LISS"]
@@ -626,6 +672,7 @@ def create_lab_technical_report(
     # Sort antigens for consistent display
     sorted_antigen_columns = sort_antigens(antigen_columns)
     sorted_user_selections = sort_antigens(user_selections)
+    user_selected_set = set(user_selections)
 
     # FIXED: Add the same antibody summary as in medical report
     confirmed_3x = [ag for ag in sorted_user_selections if "Bestätigt (3x +)" in status_map.get(ag, "")]
@@ -662,7 +709,7 @@ def create_lab_technical_report(
         reaction_counts[ag] = {
             "count": count,
             "status": status_map.get(ag, ""),
-            "user_selected": ag in user_selections,
+            "user_selected": ag in user_selected_set,
             "exclusion_reason": exclusion_reasons.get(ag, ""),
         }
 
@@ -691,18 +738,15 @@ def create_lab_technical_report(
     ]
 
     # Create original reaction table as requested with sorted columns - FIXED: compact layout
-    original_table_data = []
-    for _, row in df.iterrows():
-        record = {}
-        if "Tz.Nr." in df.columns:
-            record[" "] = row["Tz.Nr."]  # FIXED: Column name is now single space
-        record["Sp.Nr."] = row.get("Sp.Nr.", "")
-        record["LISS"] = row.get("LISS", "")
-        # FIXED: Add antigens in sorted order with formatting
-        for ag in sorted_antigen_columns:
-            if ag in row:
-                record[format_antigen(ag)] = row[ag]
-        original_table_data.append(record)
+    original_columns = ["Tz.Nr."] if "Tz.Nr." in df.columns else []
+    original_columns += ["Sp.Nr.", "LISS"]
+    original_columns += [ag for ag in sorted_antigen_columns if ag in df.columns]
+    original_table_data = (
+        _select_columns(df, original_columns)
+        # FIXED: Column name is now single space
+        .rename(columns={"Tz.Nr.": " ", **{ag: format_antigen(ag) for ag in sorted_antigen_columns}})
+        .to_dict("records")
+    )
 
     original_columns_list = []
     if "Tz.Nr." in df.columns:
@@ -804,6 +848,9 @@ def generate_pdf_report(
 ) -> bytes:
     """Generate a PDF representation of the report and return its raw bytes."""
 
+    (colors, A4, ParagraphStyle, getSampleStyleSheet, cm,
+     SimpleDocTemplate, Spacer, Paragraph, Table, TableStyle) = _reportlab()
+
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
     story: list = []
@@ -872,7 +919,6 @@ def generate_pdf_report(
     story.append(Paragraph("Antigen-Reaktionstabelle", styles["Heading3"]))
     
     # Build table data for PDF
-    positive_liss_values = {"+/-", "1+", "2+", "3+", "4+"}
     table_data = []
     
     # Header row with properly formatted antigen names
@@ -881,18 +927,7 @@ def generate_pdf_report(
     table_data.append(header_row)
     
     # Data rows
-    for _, row in df.iterrows():
-        liss_val = row.get("LISS", "-")
-        if liss_val not in positive_liss_values:
-            continue
-            
-        data_row = [
-            str(row.get("Tz.Nr.", "")),
-            str(row.get("Sp.Nr.", "")),
-            str(liss_val)
-        ]
-        data_row.extend([str(row.get(ag, "")) for ag in sorted_selections])
-        table_data.append(data_row)
+    table_data.extend(_pdf_table_rows(df, ["Tz.Nr.", "Sp.Nr.", "LISS", *sorted_selections]))
     
     if len(table_data) > 1:  # If we have data beyond the header
         pdf_table = Table(table_data)
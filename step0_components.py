@@ -6,7 +6,37 @@ import base64
 import io
 from datetime import datetime
 import json
+import hashlib
+import functools
+from pathlib import Path
+from sqlalchemy.orm import load_only
 from database import Analysis
+from bounded_lru import BoundedLRU
+
+try:
+    import diskcache
+except ImportError:  # optional, parsed uploads are then only kept in this process
+    diskcache = None
+
+# Parsed uploads are memoized on a digest of the file contents, so uploading
+# the same file again skips the PDF parse. With diskcache the entries live on
+# disk and are shared with the background upload workers, which run in their
+# own processes; otherwise a small in-process LRU is used. The cache is opened
+# on first use, next to this module rather than in the working directory.
+_PARSE_CACHE_DIR = Path(__file__).parent / "cache" / "parsed-uploads"
+
+@functools.lru_cache(maxsize=1)
+def _parse_cache():
+    return diskcache.Cache(str(_PARSE_CACHE_DIR)) if diskcache is not None else BoundedLRU(16)
+
+def _parse_cache_get(key):
+    return _parse_cache().get(key)
+
+def _parse_cache_set(key, entry):
+    if diskcache is not None:
+        _parse_cache().set(key, entry, expire=24 * 3600)
+    else:
+        _parse_cache().set(key, entry)
 
 def parse_pdf_content(contents, filename):
     """Parse uploaded PDF using tabula-py with improved error handling"""
@@ -173,8 +203,20 @@ def build_editable_diff_table(pdf_data, current_data, confidence):
     ])
 
 def parse_file_content(contents, filename):
-    """Wrapper function to handle file parsing with validation"""
+    """Wrapper function to handle file parsing with validation (memoized on the contents)"""
+    key = (hashlib.sha256(contents.encode()).hexdigest(), filename.lower().rsplit('.', 1)[-1])
+    entry = _parse_cache_get(key)
+    if entry is not None:
+        df, confidence = entry
+        return df.copy(), confidence, None
     
+    df, confidence, error_msg = _parse_file_content(contents, filename)
+    # Only successful parses are kept; a failure (e.g. tabula-py missing) is retried
+    if df is not None:
+        _parse_cache_set(key, (df.copy(), confidence))
+    return df, confidence, error_msg
+
+def _parse_file_content(contents, filename):
     # Validate file type
     if filename.lower().endswith('.pdf'):
         df = parse_pdf_content(contents, filename)
@@ -201,7 +243,13 @@ def get_step0_layout(db_session=None):
     # Get available analyses from database
     analysis_options = []
     if db_session:
-        analyses = db_session.query(Analysis).order_by(Analysis.timestamp.desc()).all()
+        # The dropdown only needs the label fields, not the stored payloads
+        analyses = (
+            db_session.query(Analysis)
+            .options(load_only(Analysis.id, Analysis.timestamp, Analysis.spendernummer))
+            .order_by(Analysis.timestamp.desc())
+            .all()
+        )
         analysis_options = [
             {
                 "label": f"ID {a.id} - {a.timestamp.strftime('%Y-%m-%d %H:%M')} - Spender: {a.spendernummer}",
@@ -2,12 +2,23 @@
 import unittest
 import tempfile
 import os
-from sqlalchemy import create_engine
+import json
+from pathlib import Path
+from unittest import mock
+import time
+from datetime import datetime, timezone
+import pandas as pd
+from plotly.utils import PlotlyJSONEncoder
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
+import importlib
 import sys
-sys.path.append('..')  # Add parent directory to path
+# The modules under test live one directory up, wherever the tests run from
+sys.path.append(str(Path(__file__).resolve().parent.parent))
 
-from database import Base, Donor, Analysis, init_database
+from database import (Base, Donor, Analysis, init_database, bulk_insert_analyses, get_analysis_by_ulid, migrate_add_id_ulid,
+                      migrate_payload_blobs)
+import database
 
 class TestDatabase(unittest.TestCase):
     def setUp(self):
@@ -68,6 +79,30 @@ class TestDatabase(unittest.TestCase):
         self.assertEqual(retrieved_analysis.get_status_data(), status_data)
         self.assertEqual(retrieved_analysis.get_user_selections(), user_selections)
     
+    def test_payload_decoded_after_expire(self):
+        """Test that payloads are read back from the stored JSON, not from the set_* arguments"""
+        self.session.add(Donor(spendernummer="EXPIRE001"))
+        analysis = Analysis(spendernummer="EXPIRE001")
+        liss_data = [{"Sp.Nr.": "EXPIRE001", "LISS": "1+", "D": "+"}]
+        analysis.set_liss_data(liss_data)
+        analysis.set_status_data({"status_map": {"D": "Nicht ausgeschlossen"}})
+        analysis.set_user_selections(["D"])
+        self.session.add(analysis)
+        self.session.commit()
+
+        # Mutating the caller's object must not reach the stored payload
+        liss_data[0]["LISS"] = "4+"
+        self.session.expire(analysis)
+        self.assertEqual(analysis.get_liss_data(), [{"Sp.Nr.": "EXPIRE001", "LISS": "1+", "D": "+"}])
+        self.assertIsNot(analysis.get_liss_data(), analysis.get_liss_data())
+
+        # A direct column write is what the getters decode
+        analysis.status_json = b'{"status_map": {"D": "Ausgeschlossen"}}'
+        self.assertEqual(analysis.get_status_data(), {"status_map": {"D": "Ausgeschlossen"}})
+        self.session.refresh(analysis)
+        self.assertEqual(analysis.get_status_data(), {"status_map": {"D": "Nicht ausgeschlossen"}})
+        self.assertEqual(analysis.get_user_selections(), ["D"])
+
     def test_lot_number_nullable(self):
         """Test that lot_number can be null for legacy rows"""
         donor = Donor(spendernummer="LEGACY001")
@@ -80,6 +115,284 @@ class TestDatabase(unittest.TestCase):
         
         retrieved = self.session.query(Analysis).filter_by(spendernummer="LEGACY001").first()
         self.assertIsNone(retrieved.lot_number)
+    
+    def test_bulk_insert_analyses_round_trip(self):
+        """Test that bulk-inserted analyses decode like ones stored via the accessors"""
+        self.session.add(Donor(spendernummer="BULK001"))
+        rows = [
+            {
+                "spendernummer": "BULK001",
+                "lot_number": f"LOT-{i}",
+                "liss_data": [{"Sp.Nr.": "BULK001", "LISS": "2+", "D": "+"}],
+                "status_data": {"status_map": {"D": "Nicht ausgeschlossen"}, "system_excluded": ["K"]},
+                "user_selections": ["D"],
+            }
+            for i in range(3)
+        ]
+        self.assertEqual(bulk_insert_analyses(self.session, rows), 3)
+        self.session.commit()
+
+        stored = self.session.query(Analysis).filter_by(spendernummer="BULK001").order_by(Analysis.id).all()
+        self.assertEqual([a.lot_number for a in stored], ["LOT-0", "LOT-1", "LOT-2"])
+        for analysis, row in zip(stored, rows):
+            self.assertEqual(analysis.get_liss_data(), row["liss_data"])
+            self.assertEqual(analysis.get_status_data(), row["status_data"])
+            self.assertEqual(analysis.get_user_selections(), row["user_selections"])
+
+        # Every row gets its own ULID from the column default
+        ulids = [a.id_ulid for a in stored]
+        self.assertTrue(all(ulid and len(ulid) == 26 for ulid in ulids))
+        self.assertEqual(len(set(ulids)), 3)
+        self.assertEqual(get_analysis_by_ulid(self.session, ulids[1]).id, stored[1].id)
+
+    def test_backfilled_ulid_time_is_utc(self):
+        """Test that backfilled ULIDs take their time part from the stored (UTC) timestamp"""
+        legacy_db = tempfile.NamedTemporaryFile(delete=False)
+        legacy_db.close()
+        legacy_engine = create_engine(f'sqlite:///{legacy_db.name}')
+        old_tz = os.environ.get("TZ")
+        try:
+            with legacy_engine.begin() as conn:
+                conn.execute(text("CREATE TABLE analyses (id INTEGER PRIMARY KEY, timestamp DATETIME)"))
+                conn.execute(text("INSERT INTO analyses (timestamp) VALUES ('2024-01-02 03:04:05.000000')"))
+            # A server outside UTC must not shift the time part
+            os.environ["TZ"] = "America/New_York"
+            time.tzset()
+            migrate_add_id_ulid(inspect(legacy_engine), bind=legacy_engine)
+            with legacy_engine.connect() as conn:
+                ulid = conn.execute(text("SELECT id_ulid FROM analyses")).scalar()
+        finally:
+            if old_tz is None:
+                os.environ.pop("TZ", None)
+            else:
+                os.environ["TZ"] = old_tz
+            time.tzset()
+            legacy_engine.dispose()
+            os.unlink(legacy_db.name)
+
+        millis = 0
+        for char in ulid[:10]:
+            millis = millis * 32 + "0123456789ABCDEFGHJKMNPQRSTVWXYZ".index(char)
+        expected = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        self.assertEqual(millis, int(expected.timestamp() * 1000))
+
+    def test_text_payloads_migrated_to_blobs(self):
+        """Test that payloads stored as TEXT by older versions become BLOBs and still decode"""
+        analysis = Analysis(spendernummer="TEXT001", timestamp=datetime.now())
+        analysis.set_status_data({"status_map": {"D": "excluded"}})
+        analysis.set_user_selections(["C", "c"])
+        self.session.add(analysis)
+        self.session.commit()
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE analyses SET status_json = CAST(status_json AS TEXT), "
+                "user_sel_json = CAST(user_sel_json AS TEXT)"
+            ))
+
+        migrate_payload_blobs(bind=self.engine)
+        migrate_payload_blobs(bind=self.engine)
+
+        with self.engine.connect() as conn:
+            types = conn.execute(text("SELECT typeof(status_json), typeof(user_sel_json) FROM analyses")).one()
+        self.assertEqual(tuple(types), ("blob", "blob"))
+        self.session.expire_all()
+        stored = self.session.query(Analysis).filter_by(spendernummer="TEXT001").one()
+        self.assertEqual(stored.get_status_data(), {"status_map": {"D": "excluded"}})
+        self.assertEqual(stored.get_user_selections(), ["C", "c"])
+
+    @unittest.skipIf(database.msgspec is None, "msgspec is not installed")
+    def test_liss_payload_typed_decoder(self):
+        """Test the typed msgspec LISS decoder and its fallback for rows that don't fit the shape"""
+        rows = [{"Tz.Nr.": 1, "D": "+", "LISS": "2+"}, {"Tz.Nr.": 2, "D": None, "LISS": 0.5}]
+        encoded = database._encode_liss(rows)
+        self.assertEqual(database._LISS_DECODER.decode(encoded), rows)
+        self.assertEqual(database._decode_liss(encoded), rows)
+
+        # Nested cells don't fit list[dict[str, scalar]]; the generic loader still reads them
+        legacy = json.dumps([{"D": {"value": "+"}}]).encode()
+        with self.assertRaises(database.msgspec.ValidationError):
+            database._LISS_DECODER.decode(legacy)
+        self.assertEqual(database._decode_liss(legacy), [{"D": {"value": "+"}}])
+        self.assertIsNone(database._decode_liss(None))
+
+    def test_liss_payload_without_msgspec(self):
+        """Test that LISS payloads round-trip through the generic codec when msgspec is missing"""
+        rows = [{"Tz.Nr.": 1, "D": "+", "LISS": "2+"}, {"D": {"value": "+"}}]
+        with mock.patch.object(database, "_LISS_DECODER", None), \
+                mock.patch.object(database, "_LISS_ENCODER", None):
+            self.assertEqual(database._decode_liss(database._encode_liss(rows)), rows)
+            self.assertEqual(database._decode_liss(json.dumps(rows)), rows)
+            self.assertIsNone(database._decode_liss(b""))
+
+    def test_approximate_row_counts_errors(self):
+        """Test that a missing sqlite_stat1 means no estimates while other errors are logged and raised"""
+        self.assertEqual(database._approximate_row_counts(self.session), {})
+
+        self.session.add(Analysis(spendernummer="STAT001", timestamp=datetime.now()))
+        self.session.commit()
+        with self.engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        self.assertEqual(database._approximate_row_counts(self.session), {"analyses": 1})
+
+        with mock.patch.object(self.session, "execute", side_effect=RuntimeError("boom")), \
+                self.assertLogs(database.logger, level="ERROR"), self.assertRaises(RuntimeError):
+            database._approximate_row_counts(self.session)
+
+    def test_single_model_registry(self):
+        """Test that the models are declared once, on a single metadata"""
+        self.assertEqual(sorted(Base.metadata.tables), ["analyses", "donors"])
+        self.assertIs(Donor.metadata, Analysis.metadata)
+
+class TestMain(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Importing main builds the Dash app and reads data.csv, so only the
+        # tests that need it pay for it
+        cls.main = importlib.import_module("main")
+
+    def assert_analysis(self, df, expected_status, expected_reasons):
+        """Compare the analysis of df with the expected statuses and exclusion reasons
+
+        expected_status lists the antigens with a reaction; every other antigen
+        is expected to have none.
+        """
+        status_map, exclusion_reasons, system_excluded = self.main._analyze_data(df)
+        self.assertEqual(list(status_map), self.main.ANTIGEN_COLUMNS)
+        self.assertEqual(status_map, {ag: expected_status.get(ag, "Keine Reaktion") for ag in self.main.ANTIGEN_COLUMNS})
+        self.assertEqual(exclusion_reasons, expected_reasons)
+        self.assertEqual(system_excluded, set(expected_reasons))
+        return status_map, exclusion_reasons, system_excluded
+
+    def test_analysis_default_panel(self):
+        """Test the automatic analysis of the default panel"""
+        excluded = ["C", "c", "e", "K", "k", "Kpb", "Fya", "Fyb", "Jka", "Leb", "P1", "N", "S", "s", "Lub", "Xga"]
+        expected_status = dict.fromkeys(excluded, "Ausgeschlossen") | {
+            "D": "Bestätigt (3x +)", "Jkb": "Bestätigt (3x +)", "M": "Bestätigt (3x +)",
+            "E": "Bestätigt (2x +)", "Kpa": "Bestätigt (2x +)", "Lea": "Bestätigt (2x +)", "Lua": "Bestätigt (2x +)",
+            "Cw": "Nicht ausgeschlossen",
+        }
+        expected_reasons = {
+            "C": "Tz Nr: 4", "c": "Tz Nr: 4, 6, 10", "e": "Tz Nr: 4, 6, 10", "K": "Tz Nr: 6",
+            "k": "Tz Nr: 4, 6, 10", "Kpb": "Tz Nr: 4, 6, 10", "Fya": "Tz Nr: 4, 10", "Fyb": "Tz Nr: 6",
+            "Jka": "Tz Nr: 4, 6, 10", "Leb": "Tz Nr: 4, 10", "P1": "Tz Nr: 6, 10", "N": "Tz Nr: 4, 6, 10",
+            "S": "Tz Nr: 4, 10", "s": "Tz Nr: 4, 6", "Lub": "Tz Nr: 4, 6, 10", "Xga": "Tz Nr: 6, 10",
+        }
+        self.assert_analysis(self.main.DATA_CLEAN, expected_status, expected_reasons)
+
+    def test_analysis_heterozygous_pairs(self):
+        """Test a panel with heterozygous pairs in negative rows"""
+        rows = [
+            {"LISS": "-", "C": "+", "c": "+", "K": "+", "k": "+", "Kpa": "+", "Kpb": "+"},
+            {"LISS": "-", "Lua": "+", "Lub": "+", "Cw": "+", "Fya": "+", "Fyb": "+"},
+            {"LISS": "-", "E": "+", "e": "0", "M": "+", "N": "+", "S": "nt"},
+            {"LISS": "2+", "C": "+", "D": "+", "Fya": "+", "Jka": "+"},
+            {"LISS": "+/-", "D": "+", "Fya": "+", "s": "+"},
+            {"LISS": "4+", "D": "+", "Fya": "+", "s": "+"},
+            {"LISS": "0", "D": "+", "Xga": "+"},
+        ]
+        df = pd.DataFrame(rows, columns=["Tz.Nr."] + self.main.ANTIGEN_COLUMNS + ["LISS"]).fillna("0")
+        df["Tz.Nr."] = range(1, len(df) + 1)
+        # Each negative row excludes every antigen it carries, heterozygous pairs included
+        expected_reasons = {
+            "C": "Tz Nr: 1", "c": "Tz Nr: 1", "K": "Tz Nr: 1", "k": "Tz Nr: 1", "Kpa": "Tz Nr: 1", "Kpb": "Tz Nr: 1",
+            "Cw": "Tz Nr: 2", "Fya": "Tz Nr: 2", "Fyb": "Tz Nr: 2", "Lua": "Tz Nr: 2", "Lub": "Tz Nr: 2",
+            "E": "Tz Nr: 3", "M": "Tz Nr: 3", "N": "Tz Nr: 3",
+        }
+        expected_status = dict.fromkeys(expected_reasons, "Ausgeschlossen") | {
+            "D": "Bestätigt (3x +)", "s": "Bestätigt (2x +)", "Jka": "Nicht ausgeschlossen",
+        }
+        expected = self.assert_analysis(df, expected_status, expected_reasons)
+        # The public entry point hands out the same result, cached or not
+        self.assertEqual(self.main.analyze_data(df), expected)
+        self.assertEqual(self.main.analyze_data(df), expected)
+
+    def test_store_round_trip_keeps_dtypes(self):
+        """Test that a frame rebuilt from its Store payload equals the original, cache hit or miss"""
+        df = self.main.DATA_CLEAN
+        payload = self.main.frame_to_store(df)
+        pd.testing.assert_frame_equal(self.main.frame_from_store(payload), df)
+
+        # A different worker only has the JSON payload
+        self.main._FRAME_CACHE.clear()
+        rebuilt = self.main.frame_from_store(json.loads(json.dumps(payload)))
+        self.assertEqual(list(rebuilt.dtypes.astype(str)), list(df.dtypes.astype(str)))
+        pd.testing.assert_frame_equal(rebuilt, df)
+
+    def test_antigen_config_follows_python_rules(self):
+        """Test that the clientside antigen config is derived from sort_antigens and format_antigen"""
+        config = self.main._ANTIGEN_CONFIG
+        shuffled = list(reversed(self.main.ANTIGEN_COLUMNS))
+        self.assertEqual(sorted(shuffled, key=config["rank"].__getitem__), self.main.sort_antigens(shuffled))
+        self.assertEqual(config["labels"], {ag: self.main.format_antigen(ag) for ag in config["labels"]})
+        self.assertTrue(set(self.main.ANTIGEN_COLUMNS) <= set(config["labels"]))
+        self.assertEqual(json.loads(json.dumps(config)), config)
+
+    def test_comparison_table_columns_in_panel_order(self):
+        """Test that the comparison table lists the union of both selections once, in panel order"""
+        included = [self.main.ANTIGEN_COLUMNS[3], self.main.ANTIGEN_COLUMNS[0]]
+        user = [self.main.ANTIGEN_COLUMNS[5], self.main.ANTIGEN_COLUMNS[0]]
+        for cache in self.main._TABLE_CACHES.values():
+            cache.clear()
+        with mock.patch.object(self.main, "build_final_table", wraps=self.main.build_final_table) as build:
+            self.main.get_step3_layout(self.main.DATA_CLEAN, included, [], user)
+        columns = next(call.args[1] for call in build.call_args_list if call.args[4] == "comparison")
+        self.assertEqual(columns, [self.main.ANTIGEN_COLUMNS[i] for i in (0, 3, 5)])
+
+    def test_cached_layout_not_mutated_by_later_calls(self):
+        """Test that a memoized step 3 layout is handed out unchanged after other layouts reuse its tables"""
+        df = self.main.DATA_CLEAN
+        included = self.main.ANTIGEN_COLUMNS[:3]
+        layout = self.main.get_step3_layout(df, included, [], included)
+        snapshot = json.dumps(layout, cls=PlotlyJSONEncoder, sort_keys=True)
+
+        # Same system table, other user and comparison tables, then paging through them
+        other = self.main.get_step3_layout(df, included, [], self.main.ANTIGEN_COLUMNS[2:5])
+        self.assertIsNot(other, layout)
+        payload = self.main.frame_to_store(df)
+        for table_id in (self.main._final_table_index(name, cols, sels) for name, cols, sels in (
+                ("system", included, None), ("user", self.main.ANTIGEN_COLUMNS[2:5], None))):
+            self.main.page_final_table(1, {"type": "final-table", "index": table_id}, payload)
+
+        again = self.main.get_step3_layout(df, included, [], included)
+        self.assertIs(again, layout)
+        self.assertEqual(json.dumps(again, cls=PlotlyJSONEncoder, sort_keys=True), snapshot)
+
+    def test_file_upload_in_request(self):
+        """Test the upload callback body, which runs in-request without a background manager"""
+        # Parsed uploads hold the cell texts as read from the file
+        parsed = self.main.DATA_CLEAN.head(4).astype(str)
+        contents = "data:application/pdf;base64,JVBERi0="
+        for confidence, builder in ((0.99, "build_diff_table"), (0.5, "build_editable_diff_table")):
+            with mock.patch.object(self.main, "parse_file_content", return_value=(parsed.copy(), confidence, None)), \
+                    mock.patch.object(self.main, builder, wraps=getattr(self.main, builder)) as build:
+                comparison, status, payload, disabled, stored_confidence = self.main.handle_file_upload(
+                    contents, "panel.pdf", None
+                )
+            build.assert_called_once()
+            self.assertIsNotNone(comparison)
+            self.assertFalse(disabled)
+            self.assertEqual(stored_confidence, confidence)
+            # The payload must survive the trip out of a background worker
+            self.main._FRAME_CACHE.clear()
+            pd.testing.assert_frame_equal(self.main.frame_from_store(json.loads(json.dumps(payload))), parsed)
+
+        comparison, status, payload, disabled, stored_confidence = self.main.handle_file_upload(
+            "data:text/plain;base64,AAAA", "panel.txt", None
+        )
+        self.assertIsNone(payload)
+        self.assertTrue(disabled)
+        self.assertEqual(status.children, "Nur PDF- und JPEG-Dateien werden unterstützt.")
+
+    def test_file_upload_background_registration(self):
+        """Test that uploads run as a background callback exactly when a manager is available"""
+        upload = next(entry for output, entry in self.main.app.callback_map.items() if "pdf-comparison-area" in output)
+        if self.main._BACKGROUND_MANAGER is None:
+            self.assertFalse(upload["background"])
+        else:
+            self.assertTrue(upload["background"])
+            # The cache sits next to the module, not in the working directory
+            self.assertEqual(Path(self.main._BACKGROUND_MANAGER.handle.directory),
+                             Path(self.main.__file__).parent / "cache")
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file